@@ -0,0 +1,163 @@
+import dataclasses
+import hashlib
+import os
+import pickle
+import time
+import types
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def _update_hash(h: "hashlib._Hash", obj) -> None:
+    """
+    Feed a canonical byte representation of `obj` into the hash `h`
+    """
+    # Tag every value with its type so e.g. 1 and "1" hash differently
+    h.update(type(obj).__name__.encode())
+
+    if isinstance(obj, pd.DataFrame):
+        h.update(repr(list(obj.columns)).encode())
+        h.update(repr([str(d) for d in obj.dtypes]).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, pd.Series):
+        h.update(repr((obj.name, str(obj.dtype))).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, pd.Index):
+        h.update(repr((obj.name, str(obj.dtype))).encode())
+        h.update(pd.util.hash_pandas_object(obj).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.dtype.str, obj.shape)).encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif sparse.issparse(obj):
+        obj = sparse.csr_array(obj)
+        obj.sort_indices()
+        for part in (obj.shape, obj.data, obj.indices, obj.indptr):
+            _update_hash(h, np.asarray(part))
+    elif dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        for field in dataclasses.fields(obj):
+            _update_hash(h, field.name)
+            _update_hash(h, getattr(obj, field.name))
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=repr):
+            _update_hash(h, key)
+            _update_hash(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(str(len(obj)).encode())
+        for item in obj:
+            _update_hash(h, item)
+    elif isinstance(obj, (set, frozenset)):
+        for item in sorted(obj, key=repr):
+            _update_hash(h, item)
+    elif isinstance(obj, (types.FunctionType, types.BuiltinFunctionType, type)):
+        h.update(f"{obj.__module__}.{obj.__qualname__}".encode())
+    elif hasattr(obj, "__dict__") and not isinstance(obj, types.ModuleType):
+        # Other objects are hashed by their public attributes, leaving out
+        # private caches
+        h.update(type(obj).__qualname__.encode())
+        _update_hash(h, {k: v for k, v in vars(obj).items() if not k.startswith("_")})
+    else:
+        h.update(repr(obj).encode())
+
+
+def hash_inputs(*objs) -> str:
+    """
+    Content hash of any mix of DataFrames, arrays, dataclasses, containers,
+    objects and plain values, used as a cache key
+    """
+    h = hashlib.sha256()
+    for obj in objs:
+        _update_hash(h, obj)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of pickled results
+
+    Entries are stored as `<path>/<key[:2]>/<key>.pkl`, where the key is
+    normally built with `hash_inputs`. Reading an entry refreshes its
+    modification time, so eviction removes the least recently used entries
+    first once the cache exceeds `max_bytes`, and any entry older than
+    `max_age_days`.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_bytes: float | None = 1e9,
+        max_age_days: float | None = None,
+    ):
+        self.path = Path(path).expanduser().resolve()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+
+    def _entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.pkl"
+
+    def __contains__(self, key: str) -> bool:
+        return self._entry_path(key).exists()
+
+    def get(self, key: str, default=None):
+        """
+        Return the cached value for `key`, or `default` if there is none
+        """
+        entry = self._entry_path(key)
+        try:
+            with open(entry, "rb") as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return default
+        os.utime(entry)
+        return value
+
+    def set(self, key: str, value) -> None:
+        """
+        Store `value` under `key`, then evict old entries if needed
+        """
+        entry = self._entry_path(key)
+        entry.parent.mkdir(exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a partial entry
+        tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, entry)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove entries older than `max_age_days`, then the least recently used
+        entries until the cache is below `max_bytes`
+        """
+        entries = []
+        for entry in self.path.glob("*/*.pkl"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            for mtime, _, entry in entries:
+                if mtime < cutoff:
+                    entry.unlink(missing_ok=True)
+            entries = [e for e in entries if e[0] >= cutoff]
+
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                entry.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self) -> None:
+        """
+        Remove every entry
+        """
+        for entry in self.path.glob("*/*.pkl"):
+            entry.unlink(missing_ok=True)
@@ -0,0 +1,189 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+import yaml
+
+TIERS = ["validated", "candidate", "potential"]
+
+
+def _label_mask(bits: dict[str, int], labels: Iterable[str]) -> int:
+    mask = 0
+    for label in labels:
+        if label in bits:
+            mask |= 1 << bits[label]
+    return mask
+
+
+@dataclass(frozen=True)
+class CompendiumView:
+    """
+    The markers of a compendium for a set of genes, labelled as in the variant
+    calls: by amino acid change for a single gene, or as `gene-aa_change`
+    across several genes. Masks are integers with one bit per label
+    """
+
+    genes: tuple[str, ...]
+    bits: dict[str, int]
+    tiers: dict[str, list[str]]
+    combinations: dict[str, list[str]]
+    combination_masks: dict[str, int]
+
+    @property
+    def validated(self) -> list[str]:
+        return self.tiers["validated"]
+
+    @property
+    def candidate(self) -> list[str]:
+        return self.tiers["candidate"]
+
+    @property
+    def combination_mutations(self) -> set[str]:
+        return {m for members in self.combinations.values() for m in members}
+
+    def mask(self, labels: Iterable[str]) -> int:
+        """
+        Mask of the given labels, ignoring any that are not in the compendium
+        """
+        return _label_mask(self.bits, labels)
+
+    def carried_combinations(self, labels: Iterable[str]) -> list[str]:
+        """
+        Names of the combinations whose mutations are all among `labels`
+        """
+        mask = self.mask(labels)
+        return [
+            name
+            for name, combo_mask in self.combination_masks.items()
+            if combo_mask & mask == combo_mask
+        ]
+
+
+class Compendium:
+    """
+    Compiled list of drug resistance markers (see `WHO_compendium_list.yml`)
+
+    Every mutation named in the compendium gets a bit position, and each
+    gene, tier, combination and multigene combination is held as a mask over
+    those bits. Mutations are named `gene-aa_change` throughout
+    """
+
+    def __init__(self, muts_dict: dict):
+        self.bits: dict[str, int] = {}
+        self.members: dict[str, tuple[str, str]] = {}
+        self.tiers: dict[str, dict[str, list[str]]] = {}
+        self.combinations: dict[str, dict] = {}
+        self.multigene: dict[str, dict] = {}
+        self.genes = [g for g in muts_dict if g != "multigene"]
+
+        for gene in self.genes:
+            target = muts_dict[gene] or {}
+            self.tiers[gene] = {
+                tier: [self._add(gene, aa) for aa in target.get(tier, [])]
+                for tier in TIERS
+            }
+            self.combinations[gene] = {
+                name: [self._add(gene, aa) for aa in members]
+                for name, members in (target.get("combinations") or {}).items()
+            }
+
+        for group, combos in (muts_dict.get("multigene") or {}).items():
+            self.multigene[group] = {
+                name: [self._add(*m.split("-", 1)) for m in members]
+                for name, members in combos.items()
+            }
+
+        self.gene_masks = {
+            gene: self.mask(m for m, (g, _) in self.members.items() if g == gene)
+            for gene in {g for g, _ in self.members.values()}
+        }
+        self.tier_masks = {
+            tier: self.mask(m for t in self.tiers.values() for m in t[tier])
+            for tier in TIERS
+        }
+        self.combination_masks = {
+            key: {name: self.mask(members) for name, members in combos.items()}
+            for key, combos in (self.combinations | self.multigene).items()
+        }
+        self._views: dict[tuple[str, ...], CompendiumView] = {}
+
+    def _add(self, gene: str, aa_change: str) -> str:
+        mutation = f"{gene}-{aa_change}"
+        if mutation not in self.bits:
+            self.bits[mutation] = len(self.bits)
+            self.members[mutation] = (gene, aa_change)
+        return mutation
+
+    def mask(self, mutations: Iterable[str]) -> int:
+        """
+        Mask of the given `gene-aa_change` mutations
+        """
+        mask = 0
+        for mutation in mutations:
+            mask |= 1 << self.bits[mutation]
+        return mask
+
+    def view(self, genes: str | Iterable[str]) -> CompendiumView:
+        """
+        Markers and combinations for `genes`, including the multigene
+        combinations whose genes are all among them
+        """
+        genes = (genes,) if isinstance(genes, str) else tuple(genes)
+        if genes in self._views:
+            return self._views[genes]
+
+        if len(genes) > 1:
+            label = lambda mutation: mutation
+        else:
+            label = lambda mutation: self.members[mutation][1]
+
+        groups = [
+            group for group in self.multigene if set(group.split("-")).issubset(genes)
+        ]
+        combos = [self.combinations[g] for g in genes if g in self.combinations]
+        combos += [self.multigene[group] for group in groups]
+        # Later combinations with the same name replace earlier ones
+        combinations = {
+            name: members for combo in combos for name, members in combo.items()
+        }
+
+        selected = [m for m, (g, _) in self.members.items() if g in genes]
+        selected += [m for members in combinations.values() for m in members]
+        bits = {label(m): i for i, m in enumerate(dict.fromkeys(selected))}
+        combinations = {
+            name: [label(m) for m in members] for name, members in combinations.items()
+        }
+
+        view = CompendiumView(
+            genes=genes,
+            bits=bits,
+            tiers={
+                tier: [label(m) for g in genes if g in self.tiers for m in self.tiers[g][tier]]
+                for tier in TIERS
+            },
+            combinations=combinations,
+            combination_masks={
+                name: _label_mask(bits, members) for name, members in combinations.items()
+            },
+        )
+        self._views[genes] = view
+        return view
+
+
+# Compiled compendia by path, with the modification time they were read at
+_COMPENDIA: dict[Path, tuple[int, Compendium]] = {}
+
+
+def load_compendium(path: str | Path) -> Compendium:
+    """
+    Load and compile a compendium YAML file, reusing the compiled version
+    until the file changes
+    """
+    path = Path(path).expanduser().resolve()
+    mtime = path.stat().st_mtime_ns
+    cached = _COMPENDIA.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "r") as f:
+            cached = (mtime, Compendium(yaml.safe_load(f)))
+        _COMPENDIA[path] = cached
+    return cached[1]
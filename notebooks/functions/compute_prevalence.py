@@ -1,7 +1,13 @@
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from typing import Optional
 
+import numpy as np
 import pandas as pd
-from statsmodels.stats.proportion import proportion_confint
+
+from confint import clopper_pearson
 
 # These columns are used to define unique variants
 VARIANTS_GROUP_COLUMNS = [
@@ -17,8 +23,33 @@ VARIANTS_MUTATION_COLUMNS = [
     "mutation",
 ]
 
+# Call types counted by `count_variant_types`, in the order of their codes
+VARIANT_TYPES = ["mixed_mut", "mut", "wt", "filtered"]
+
+
+def count_variant_types(
+    variants_df: pd.DataFrame, by: list[str], sort: bool = True, dropna: bool = True
+) -> pd.DataFrame:
+    """
+    Count calls of each `type` within the groups `by`, one-hot encoding
+    `type` once so that every count comes from a single grouped sum
+    """
+    codes = pd.Categorical(variants_df["type"], categories=VARIANT_TYPES).codes
+    one_hot = pd.DataFrame(
+        {
+            "n_mixed": codes == 0,
+            "n_mut": codes == 1,
+            "n_wt": codes == 2,
+            "n_passed": codes != 3,
+            "n_samples": np.ones(len(codes), dtype=bool),
+        },
+        index=variants_df.index,
+    ).astype(np.int64)
+    keys = [variants_df[column] for column in by]
+    return one_hot.groupby(keys, observed=True, sort=sort, dropna=dropna).sum()
+
 
-# Taken verbatim from nomadic
+# Adapted from nomadic
 def compute_variant_prevalence(
     variants_df: pd.DataFrame,
     master_df: Optional[pd.DataFrame] = None,
@@ -38,35 +69,31 @@ def compute_variant_prevalence(
         assert all(group in master_df.columns for group in additional_groups), (
             "all additional_groups must be columns in master_df"
         )
-        variants_df = variants_df.merge(
-            master_df[["sample_id", *additional_groups]],
-            on="sample_id",
-            how="left",
-            validate="m:1",
-        )
 
-    agg_aa_change_df = (
-        variants_df.loc[variants_df["type"].isin(["mixed_mut", "mut"])]
-        .groupby(
-            VARIANTS_GROUP_COLUMNS + VARIANTS_MUTATION_COLUMNS + additional_groups,
-        )
-        .agg(
-            n_mixed=pd.NamedAgg("type", lambda x: (x == "mixed_mut").sum()),
-            n_mut=pd.NamedAgg("type", lambda x: (x == "mut").sum()),
-        )
-    )
+    state = PrevalenceState.from_variants(variants_df, master_df, additional_groups)
+    return state.to_prevalence(additional_groups)
 
-    groups = (
-        variants_df[VARIANTS_GROUP_COLUMNS + additional_groups]
-        .drop_duplicates()
-        .dropna()
-    )
-    muts = (
-        variants_df[VARIANTS_GROUP_COLUMNS + VARIANTS_MUTATION_COLUMNS]
-        .query("mut_type == 'missense'")
-        .drop_duplicates()
-        .dropna()
-    )
+
+def _mutant_calls(variants_df: pd.DataFrame) -> pd.DataFrame:
+    return variants_df.loc[variants_df["type"].isin(["mixed_mut", "mut"])]
+
+
+def assemble_prevalence(
+    agg_aa_change_df: pd.DataFrame,
+    agg_aa_pos_df: pd.DataFrame,
+    muts: pd.DataFrame,
+    additional_groups: list[str],
+) -> pd.DataFrame:
+    """
+    Build the prevalence table from mutation-level counts (indexed by the group,
+    mutation and additional columns) and position-level counts (with those
+    columns, in the order the rows should follow)
+    """
+    agg_aa_change_df = agg_aa_change_df[["n_mixed", "n_mut"]]
+    agg_aa_pos_df = agg_aa_pos_df[
+        VARIANTS_GROUP_COLUMNS + additional_groups + ["n_samples", "n_passed", "n_wt"]
+    ]
+    groups = agg_aa_pos_df[VARIANTS_GROUP_COLUMNS + additional_groups]
 
     # Build full index so we see also values for groups that have no mutation
     full_index = (
@@ -77,15 +104,8 @@ def compute_variant_prevalence(
         .index
     )
     # Ensure all n_mut, n_mixed are filled with zeros
-    agg_aa_change_df = agg_aa_change_df.reindex(full_index).reset_index().fillna(0)
-
-    agg_aa_pos_df = variants_df.groupby(
-        VARIANTS_GROUP_COLUMNS + additional_groups,
-        as_index=False,
-    ).agg(
-        n_samples=pd.NamedAgg("type", "size"),
-        n_passed=pd.NamedAgg("type", lambda x: sum(x != "filtered")),
-        n_wt=pd.NamedAgg("type", lambda x: sum(x == "wt")),
+    agg_aa_change_df = (
+        agg_aa_change_df.reindex(full_index).reset_index().fillna({"n_mixed": 0, "n_mut": 0})
     )
 
     prev_df = agg_aa_change_df.merge(
@@ -95,6 +115,14 @@ def compute_variant_prevalence(
         validate="m:1",
     )
 
+    return add_prevalence_columns(prev_df)
+
+
+def add_prevalence_columns(prev_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the per-type frequencies, prevalence and its 95% confidence interval
+    to a table of `n_mixed`, `n_mut`, `n_wt` and `n_passed` counts
+    """
     # Compute frequencies
     prev_df["per_wt"] = 100 * prev_df["n_wt"] / prev_df["n_passed"]
     prev_df["per_mixed"] = 100 * prev_df["n_mixed"] / prev_df["n_passed"]
@@ -104,13 +132,294 @@ def compute_variant_prevalence(
     prev_df["prevalence"] = prev_df["per_mixed"] + prev_df["per_mut"]
 
     # Compute prevalence 95% confidence intervals
-    low, high = proportion_confint(
+    low, high = clopper_pearson(
         prev_df["n_mut"] + prev_df["n_mixed"],
         prev_df["n_passed"],
         alpha=0.05,
-        method="beta",
     )
     prev_df["prevalence_lowci"] = 100 * low
     prev_df["prevalence_highci"] = 100 * high
 
     return prev_df
+
+
+def _bootstrap_chunk(
+    args: tuple[np.random.SeedSequence, int, np.ndarray, np.ndarray],
+) -> np.ndarray:
+    """
+    Prevalence (%) of every row in `n_reps` cluster bootstrap replicates, used
+    as the process pool task
+    """
+    seed, n_reps, k, n = args
+    rng = np.random.default_rng(seed)
+    n_clusters = k.shape[0]
+    # How many times each cluster is drawn when resampling with replacement
+    weights = rng.multinomial(
+        n_clusters, np.full(n_clusters, 1 / n_clusters), size=n_reps
+    ).astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 * (weights @ k) / (weights @ n)
+
+
+def cluster_bootstrap_prevalence(
+    variants_df: pd.DataFrame,
+    master_df: pd.DataFrame,
+    cluster: str,
+    additional_groups: Optional[list[str]] = None,
+    n_boot: int = 1000,
+    alpha: float = 0.05,
+    seed: Optional[int] = None,
+    n_jobs: int = 1,
+    chunk_size: int = 250,
+) -> pd.DataFrame:
+    """
+    Compute the prevalence table with percentile confidence intervals from a
+    cluster bootstrap, added as `prevalence_boot_lowci` and
+    `prevalence_boot_highci` next to the binomial ones
+
+    Samples are resampled as whole clusters (the `cluster` column of
+    `master_df`, e.g. site). The counts are taken once per cluster and row, so
+    every replicate is a weighted sum of those counts and each chunk of
+    replicates is a single matrix multiply. Chunks can be spread over a process
+    pool with `n_jobs` (-1 uses all available cores); the result depends only
+    on `seed`, not on `n_jobs`
+    """
+    additional_groups = list(additional_groups) if additional_groups is not None else []
+    if cluster in additional_groups:
+        raise ValueError(f"Cannot stratify by the cluster column '{cluster}'")
+    clusters = variants_df[["sample_id"]].merge(
+        master_df[["sample_id", cluster]], on="sample_id", how="left", validate="m:1"
+    )[cluster]
+    if clusters.isna().any():
+        raise ValueError(f"Every sample needs a '{cluster}' value to bootstrap by cluster")
+
+    state = PrevalenceState.from_variants(
+        variants_df, master_df, [*additional_groups, cluster]
+    )
+    prev_df = state.to_prevalence(additional_groups)
+    cluster_df = state.to_prevalence([*additional_groups, cluster])
+
+    # Cluster x row arrays of mutant and passed counts
+    keys = VARIANTS_GROUP_COLUMNS + VARIANTS_MUTATION_COLUMNS + additional_groups
+    row_ix = pd.MultiIndex.from_frame(prev_df[keys]).get_indexer(
+        pd.MultiIndex.from_frame(cluster_df[keys])
+    )
+    cluster_ix, cluster_names = pd.factorize(cluster_df[cluster])
+    k = np.zeros((len(cluster_names), len(prev_df)))
+    n = np.zeros((len(cluster_names), len(prev_df)))
+    np.add.at(k, (cluster_ix, row_ix), cluster_df["n_mut"] + cluster_df["n_mixed"])
+    np.add.at(n, (cluster_ix, row_ix), cluster_df["n_passed"])
+
+    chunk_sizes = [min(chunk_size, n_boot - i) for i in range(0, n_boot, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    tasks = [(s, size, k, n) for s, size in zip(seeds, chunk_sizes)]
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(tasks))
+    if n_jobs <= 1:
+        replicates = [_bootstrap_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            replicates = list(pool.map(_bootstrap_chunk, tasks))
+
+    low, high = np.nanpercentile(
+        np.concatenate(replicates), [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0
+    )
+    prev_df["prevalence_boot_lowci"] = low
+    prev_df["prevalence_boot_highci"] = high
+
+    return prev_df
+
+
+class PrevalenceState:
+    """
+    Persistable type counts behind the prevalence tables, so that new experiments
+    can be folded in, or retracted, without recounting the whole cohort
+
+    Three count tables are kept, each in order of first appearance:
+    - `mut_counts`: n_mixed and n_mut per group, mutation and strata
+    - `pos_counts`: n_samples, n_passed and n_wt per group and strata
+    - `missense_counts`: number of missense calls per group and mutation
+
+    Missing strata values are kept so they still count towards coarser tables.
+    Percentages and confidence intervals are derived by `to_prevalence`
+    """
+
+    MUT_COUNT_COLUMNS = ["n_mixed", "n_mut"]
+    POS_COUNT_COLUMNS = ["n_samples", "n_passed", "n_wt"]
+
+    def __init__(
+        self,
+        mut_counts: pd.DataFrame,
+        pos_counts: pd.DataFrame,
+        missense_counts: pd.DataFrame,
+        strata: list[str],
+    ):
+        self.mut_counts = mut_counts
+        self.pos_counts = pos_counts
+        self.missense_counts = missense_counts
+        self.strata = list(strata)
+
+    @classmethod
+    def from_variants(
+        cls,
+        variants_df: pd.DataFrame,
+        master_df: Optional[pd.DataFrame] = None,
+        strata: Optional[list[str]] = None,
+    ) -> "PrevalenceState":
+        """
+        Count the variant rows in `variants_df`, stratified by the `strata`
+        columns of `master_df`
+        """
+        strata = list(strata) if strata is not None else []
+        if strata:
+            variants_df = variants_df.merge(
+                master_df[["sample_id", *strata]],
+                on="sample_id",
+                how="left",
+                validate="m:1",
+            )
+
+        mut_counts = count_variant_types(
+            _mutant_calls(variants_df),
+            VARIANTS_GROUP_COLUMNS + VARIANTS_MUTATION_COLUMNS + strata,
+            sort=False,
+            dropna=False,
+        )[cls.MUT_COUNT_COLUMNS]
+        pos_counts = count_variant_types(
+            variants_df, VARIANTS_GROUP_COLUMNS + strata, sort=False, dropna=False
+        )[cls.POS_COUNT_COLUMNS]
+        missense_counts = (
+            variants_df.loc[variants_df["mut_type"] == "missense"]
+            .groupby(VARIANTS_GROUP_COLUMNS + VARIANTS_MUTATION_COLUMNS, sort=False, observed=True)
+            .size()
+            .to_frame("n_calls")
+        )
+        return cls(mut_counts, pos_counts, missense_counts, strata)
+
+    @staticmethod
+    def _combine(counts: pd.DataFrame, other: pd.DataFrame, sign: int) -> pd.DataFrame:
+        keys = list(counts.index.names)
+        combined = (
+            pd.concat([counts, sign * other])
+            .reset_index()
+            .groupby(keys, sort=False, dropna=False, observed=True)
+            .sum()
+        )
+        if (combined < 0).any(axis=None):
+            raise ValueError("Cannot retract counts that were never added")
+        # Drop keys whose counts were fully retracted
+        return combined.loc[combined.any(axis=1)]
+
+    def _merge(self, other: "PrevalenceState", sign: int) -> "PrevalenceState":
+        if other.strata != self.strata:
+            raise ValueError(f"Strata differ: {self.strata} and {other.strata}")
+        return PrevalenceState(
+            self._combine(self.mut_counts, other.mut_counts, sign),
+            self._combine(self.pos_counts, other.pos_counts, sign),
+            self._combine(self.missense_counts, other.missense_counts, sign),
+            self.strata,
+        )
+
+    def add(self, other: "PrevalenceState") -> "PrevalenceState":
+        """
+        State with the counts of `other` folded in
+        """
+        return self._merge(other, 1)
+
+    def subtract(self, other: "PrevalenceState") -> "PrevalenceState":
+        """
+        State with the counts of `other` retracted
+        """
+        return self._merge(other, -1)
+
+    def update(
+        self, variants_df: pd.DataFrame, master_df: Optional[pd.DataFrame] = None
+    ) -> "PrevalenceState":
+        """
+        Fold in the variant rows of a new experiment
+        """
+        return self.add(self.from_variants(variants_df, master_df, self.strata))
+
+    def retract(
+        self, variants_df: pd.DataFrame, master_df: Optional[pd.DataFrame] = None
+    ) -> "PrevalenceState":
+        """
+        Remove the variant rows of an experiment that was previously folded in
+        """
+        return self.subtract(self.from_variants(variants_df, master_df, self.strata))
+
+    def save(self, path: str | Path) -> None:
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "PrevalenceState":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def to_prevalence(self, by: Optional[list[str]] = None) -> pd.DataFrame:
+        """
+        Prevalence table stratified by `by`, any subset of the strata
+        """
+        by = list(by) if by is not None else []
+        if not set(by) <= set(self.strata):
+            raise ValueError(f"Can only stratify by {self.strata}, got {by}")
+
+        agg_aa_change_df = (
+            self.mut_counts.reset_index()
+            .groupby(VARIANTS_GROUP_COLUMNS + VARIANTS_MUTATION_COLUMNS + by, observed=True)
+            [self.MUT_COUNT_COLUMNS]
+            .sum()
+        )
+        agg_aa_pos_df = (
+            self.pos_counts.reset_index()
+            .groupby(VARIANTS_GROUP_COLUMNS + by, sort=False, observed=True)
+            [self.POS_COUNT_COLUMNS]
+            .sum()
+            .reset_index()
+        )
+        muts = self.missense_counts.reset_index()[
+            VARIANTS_GROUP_COLUMNS + VARIANTS_MUTATION_COLUMNS
+        ]
+        return assemble_prevalence(agg_aa_change_df, agg_aa_pos_df, muts, by)
+
+
+class PrevalenceCube:
+    """
+    Prevalence tables for several stratifications at once, computed as grouping
+    sets: the type counts are taken in a single pass at the finest level (every
+    category together) and each table is rolled up from those counts
+
+    Tables are keyed by category, with the overall total under "All", and match
+    `compute_variant_prevalence(variants_df, master_df, [category])`
+    """
+
+    def __init__(
+        self,
+        variants_df: pd.DataFrame,
+        master_df: Optional[pd.DataFrame] = None,
+        categories: Optional[list[str]] = None,
+        state: Optional[PrevalenceState] = None,
+    ):
+        self.categories = list(categories) if categories is not None else []
+        self.genes = variants_df["gene"].dropna().unique().tolist()
+        if state is None:
+            state = PrevalenceState.from_variants(variants_df, master_df, self.categories)
+        self.state = state
+
+        self.tables = {"All": state.to_prevalence()}
+        for category in self.categories:
+            self.tables[category] = state.to_prevalence([category])
+
+    def get(self, by: str = "All", genes: Optional[list[str]] = None) -> pd.DataFrame:
+        """
+        Prevalence table stratified by `by`, optionally restricted to `genes`
+        """
+        if by not in self.tables:
+            raise KeyError(f"No prevalence computed for '{by}', use one of {list(self.tables)}")
+        prev_df = self.tables[by]
+        if genes is not None:
+            prev_df = prev_df[prev_df["gene"].isin(genes)]
+        return prev_df.reset_index(drop=True)
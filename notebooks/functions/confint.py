@@ -0,0 +1,61 @@
+from collections import OrderedDict
+
+import numpy as np
+from statsmodels.stats.proportion import proportion_confint
+
+# Most recently used (k, n, alpha) -> (low, high) intervals, shared by every
+# caller in the session
+_INTERVALS: OrderedDict[tuple[float, float, float], tuple[float, float]] = OrderedDict()
+MAX_CACHED_INTERVALS = 100_000
+
+
+def clopper_pearson(k, n, alpha: float = 0.05) -> tuple[np.ndarray, np.ndarray] | tuple[float, float]:
+    """
+    Clopper-Pearson (exact beta) confidence intervals for `k` successes out of
+    `n`, identical to `proportion_confint(k, n, alpha, method="beta")`
+
+    Tables repeat the same (k, n) pairs many times, so the beta quantiles are
+    computed once per unique pair and remembered across calls. Missing counts
+    give missing intervals. Scalar counts give a pair of floats
+    """
+    if np.ndim(k) == np.ndim(n) == 0:
+        low, high = clopper_pearson(np.atleast_1d(k), np.atleast_1d(n), alpha)
+        return float(low[0]), float(high[0])
+
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    k, n = np.broadcast_arrays(k, n)
+    low = np.full(k.shape, np.nan)
+    high = np.full(k.shape, np.nan)
+
+    valid = ~(np.isnan(k) | np.isnan(n))
+    if not valid.any():
+        return low, high
+    # Pack each pair into one complex number so the unique pairs come from a
+    # single sort
+    pairs, inverse = np.unique(k[valid] + 1j * n[valid], return_inverse=True)
+    keys = [(pk, pn, alpha) for pk, pn in zip(pairs.real.tolist(), pairs.imag.tolist())]
+
+    # Compute the pairs not seen before in a single vectorised call
+    missing = [i for i, key in enumerate(keys) if key not in _INTERVALS]
+    if missing:
+        missing_low, missing_high = proportion_confint(
+            pairs.real[missing], pairs.imag[missing], alpha=alpha, method="beta"
+        )
+        for i, l, h in zip(missing, missing_low, missing_high):
+            _INTERVALS[keys[i]] = (l, h)
+
+    for key in keys:
+        _INTERVALS.move_to_end(key)
+    unique_ci = np.array([_INTERVALS[key] for key in keys]).reshape(-1, 2)
+    while len(_INTERVALS) > MAX_CACHED_INTERVALS:
+        _INTERVALS.popitem(last=False)
+
+    inverse = inverse.reshape(-1)
+    low[valid] = unique_ci[inverse, 0]
+    high[valid] = unique_ci[inverse, 1]
+    return low, high
+
+
+def clear_interval_cache() -> None:
+    _INTERVALS.clear()
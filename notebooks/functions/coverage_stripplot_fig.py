@@ -0,0 +1,29 @@
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+
+def coverage_stripplot_fig(
+    df_bedcov: pd.DataFrame,
+    x: str = "barcode",
+    min_reads: float | None = None,
+) -> plt.Figure:
+    """
+    Strip plot of the reads per amplicon of an experiment, coloured by amplicon
+    Args:
+        df_bedcov (pd.DataFrame): Region coverage of the experiment, as held by `DeletionFinder`
+        x (str): Column to spread the points over, e.g. "barcode" or "name"
+        min_reads (float): Draws a line at this number of reads
+    Returns:
+        plt.Figure: The generated strip plot as a matplotlib fig.
+    """
+    fig, ax = plt.subplots()
+    sns.stripplot(data=df_bedcov, x=x, y="n_reads", hue="name", log_scale=True, ax=ax)
+    if min_reads is not None:
+        ax.axhline(min_reads, color="red", linestyle="--", linewidth=1)
+    if x != "name":
+        # One entry per amplicon, kept clear of the points
+        ax.legend(loc="upper left", bbox_to_anchor=(1.02, 1), borderaxespad=0)
+    ax.tick_params(axis="x", labelrotation=90)
+    fig.tight_layout()
+    return fig
@@ -1,16 +1,60 @@
 import math
-import random
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
+from scipy.special import expit, gammaln
+
+from cache import ResultCache, hash_inputs
+from confint import clopper_pearson
+
+try:
+    import numba
+except ImportError:  # optional, the pure Python engine is used instead
+    numba = None
+
+# Whether the compiled single-chain kernel is available. With it, running the
+# chains one by one is faster than advancing them together with
+# `BatchedDeletionMCMC`, which is pure numpy
+HAVE_NUMBA = numba is not None
 
 # --------------------------------------------------------------------------------
 # MCMC Components
 #
 # --------------------------------------------------------------------------------
 
+class DirMultLikelihood:
+    """
+    Vectorised Dirichlet-Multinomial log-probability for a fixed set of counts
+
+    The read counts never change during an MCMC, so every term that depends
+    only on them (the total, lgamma(n + 1) and lgamma(x + 1)) is computed once
+    here and each evaluation is then a single array call over all barcodes.
+
+    """
+
+    def __init__(self, xs: np.ndarray):
+        self.xs = np.asarray(xs, dtype=float)
+        self.n = self.xs.sum()
+        self.const = gammaln(self.n + 1) - gammaln(self.xs + 1).sum()
+
+    def logprob(self, alphas: np.ndarray) -> float:
+        """
+        Compute the log-probability of the stored counts given `alphas`
+        
+        """
+        
+        alpha_sum = alphas.sum()
+        C = self.const + gammaln(alpha_sum) - gammaln(self.n + alpha_sum)
+        R = (gammaln(self.xs + alphas) - gammaln(alphas)).sum()
+        
+        return R + C
+
+
 def calc_dirmult_logprob(alphas: np.ndarray, xs: np.ndarray):
     """
     Compute the log-probability from a Dirichlet-Multinomial distribution
@@ -19,20 +63,7 @@ def calc_dirmult_logprob(alphas: np.ndarray, xs: np.ndarray):
     
     assert xs.shape[0] == alphas.shape[0]
     
-    n = xs.sum()
-    alpha_sum = alphas.sum()
-    
-    C = math.lgamma(alpha_sum) + math.lgamma(n + 1) - math.lgamma(n + alpha_sum)
-    
-    R = 0
-    for alpha, x in zip(alphas, xs):
-        try:
-            R += math.lgamma(x + alpha) - math.lgamma(alpha) - math.lgamma(x + 1)
-        except ValueError:
-            print("x:", x, "alpha: ", alpha, "R: ", R)
-            raise ValueError
-        
-    return R + C
+    return DirMultLikelihood(xs).logprob(alphas)
 
 
 def calc_logprior(copies: int, prior_del: float = 0.05):
@@ -40,7 +71,7 @@ def calc_logprior(copies: int, prior_del: float = 0.05):
     return np.log(prior).sum()
 
 
-def propose_copies(current_copies):
+def propose_copies(current_copies, rng: np.random.Generator | None = None):
     """
     Propose a new copy number vector based on the current copies
     
@@ -56,8 +87,11 @@ def propose_copies(current_copies):
     
     """
     
+    if rng is None:
+        rng = np.random.default_rng()
+
     n = current_copies.shape[0]
-    ix = np.random.choice(n, size=1)[0]
+    ix = rng.integers(n)
     propose_copies = np.copy(current_copies)
     propose_copies[ix] = 1 - propose_copies[ix]
     
@@ -77,12 +111,142 @@ def get_alphas(copies, sample_ests, error_rate, scale):
     return adj_props * scale
 
 
+def _metropolis_loop(
+    copies, current_loglike, u, xs, qualities, terms_del, 
+    alpha_scale, alpha_del, loglike_const, log_prior_present, log_prior_del,
+    first_kept, copy_out, loglike_out, accepted_out, copy_sums,
+):
+    """
+    Single-flip Metropolis loop written with scalar loops only, so that it can be
+    compiled by numba and run without allocating. Proposal `i` flips barcode
+    int(u[i, 0] * n) and is accepted when log(u[i, 1]) is below the log ratio,
+    exactly as `DeletionMCMC._metropolis_step` does
+
+    `copies` is updated in place. States are written to `copy_out` and
+    `loglike_out` when they have rows, and added to `copy_sums` from proposal
+    `first_kept` onwards. Returns the final log posterior and acceptances
+    """
+    
+    n = copies.shape[0]
+    n_accepted = 0
+    n_present = 0
+    for j in range(n):
+        n_present += copies[j]
+    
+    for i in range(u.shape[0]):
+        ix = int(u[i, 0] * n)
+        copies[ix] = 1 - copies[ix]
+        n_present_proposed = n_present + (1 if copies[ix] else -1)
+        
+        total = 0.0
+        for j in range(n):
+            if copies[j]:
+                total += qualities[j]
+        if total > 0:
+            terms = 0.0
+            for j in range(n):
+                if copies[j]:
+                    alpha = alpha_scale * qualities[j] / total + alpha_del
+                    terms += math.lgamma(xs[j] + alpha) - math.lgamma(alpha)
+                else:
+                    terms += terms_del[j]
+            proposed_loglike = (
+                loglike_const + terms 
+                + n_present_proposed * log_prior_present
+                + (n - n_present_proposed) * log_prior_del
+            )
+        else:
+            proposed_loglike = -math.inf
+        
+        if math.log(u[i, 1]) < proposed_loglike - current_loglike:
+            current_loglike = proposed_loglike
+            n_present = n_present_proposed
+            n_accepted += 1
+        else:
+            copies[ix] = 1 - copies[ix]
+        
+        if copy_out.shape[0] > 0:
+            for j in range(n):
+                copy_out[i, j] = copies[j]
+            loglike_out[i] = current_loglike
+            accepted_out[i] = n_accepted
+        if i >= first_kept:
+            for j in range(n):
+                copy_sums[j] += copies[j]
+    
+    return current_loglike, n_accepted
+
+
+if numba is not None:
+    _metropolis_kernel = numba.njit(cache=True, nogil=True)(_metropolis_loop)
+else:
+    _metropolis_kernel = None
+
+
 # --------------------------------------------------------------------------------
 # MCMC Class
 #
 # --------------------------------------------------------------------------------
 
 
+@dataclass
+class SamplerSettings:
+    """
+    Settings controlling how a `DeletionMCMC` is run and what it stores
+
+    store:
+        "trace" keeps the full copy state of every iteration (as uint8) along with
+        the log-likelihood and acceptance rate traces. "summary" only keeps running
+        post burn-in sums of the copy states, so memory does not grow with
+        `n_iters`; set `thin` to also keep every `thin`-th state as packed bits
+    sampler:
+        "metropolis" flips one random barcode per iteration. "gibbs" performs a
+        systematic scan, drawing every barcode from its full conditional, so one
+        iteration is a whole sweep and far fewer `n_iters` are needed (a few
+        thousand). "block" is Metropolis flipping on average `n_flips` barcodes
+    backend:
+        "numba" runs the whole metropolis loop as compiled code, "python" uses the
+        vectorised numpy engine and "auto" picks numba when it is installed. Both
+        consume the same random numbers so give the same chain for a fixed seed.
+        Other samplers and thinned "summary" storage always use Python
+    adaptive:
+        Run `n_chains` chains in chunks of `chunk_size` iterations, discarding the
+        first half of each chain as burn-in, until the posterior deletion
+        probabilities change by less than `tol` between chunks, split-R-hat is
+        below `max_rhat` and the ESS is above `min_ess` for every barcode.
+        `n_iters` is then the maximum number of iterations per chain
+    """
+    n_iters: int = 50_000
+    n_burn: int = 1_000
+    store: str = "trace"
+    thin: int | None = None
+    sampler: str = "metropolis"
+    n_flips: float = 3.0
+    backend: str = "auto"
+    adaptive: bool = False
+    n_chains: int = 4
+    chunk_size: int = 500
+    tol: float = 0.01
+    max_rhat: float = 1.05
+    min_ess: float = 100
+
+    def __post_init__(self):
+        if self.sampler not in ("metropolis", "gibbs", "block"):
+            raise ValueError(
+                f"Unknown sampler '{self.sampler}', use 'metropolis', 'gibbs' or 'block'"
+            )
+        if self.backend not in ("auto", "python", "numba"):
+            raise ValueError(f"Unknown backend '{self.backend}', use 'auto', 'python' or 'numba'")
+        if self.backend == "numba" and numba is None:
+            raise ImportError("numba is not installed, use backend='python' or 'auto'")
+        if self.store not in ("trace", "summary"):
+            raise ValueError(f"Unknown store '{self.store}', use 'trace' or 'summary'")
+        if self.thin is not None and self.thin < 1:
+            raise ValueError("thin must be a positive integer")
+        if self.adaptive and self.n_chains < 2:
+            raise ValueError("adaptive runs need at least two chains to compute R-hat")
+
+
 class DeletionMCMC:
     def __init__(self, 
                  read_counts_df: pd.DataFrame, 
@@ -90,10 +254,15 @@ class DeletionMCMC:
                  sample_qualities: np.ndarray,
                  sample_dispersion: float,
                  error_rate: float,
-                 prior_del: float=0.5  # is it OKAY to put such a prior on deletions?
+                 prior_del: float=0.5,  # is it OKAY to put such a prior on deletions?
+                 seed: int | np.random.SeedSequence | None = None,
+                 settings: SamplerSettings | None = None,
                 ):
         """
         Initialise the data
+
+        Each chain owns its own `np.random.Generator` built from `seed`, so
+        chains run in parallel can be reproduced exactly
         
         """
         
@@ -105,74 +274,917 @@ class DeletionMCMC:
         self.sample_dispersion = sample_dispersion
         self.error_rate = error_rate
         self.prior_del = prior_del
+        self.rng = np.random.default_rng(seed)
+        self.settings = settings if settings is not None else SamplerSettings()
+
+        # Cached terms that are fixed for the lifetime of the chain
+        self.likelihood = DirMultLikelihood(self.data)
+        self.log_prior_del = np.log(prior_del)
+        self.log_prior_present = np.log(1 - prior_del)
+
+        # With a fixed total abundance the alphas sum to a constant, and a deleted
+        # barcode always has alpha = scale * error_rate, so its term is fixed too
+        self.alpha_del = sample_dispersion * error_rate
+        self.alpha_scale = sample_dispersion * (1 - 2 * error_rate)
+        self.terms_del = gammaln(self.likelihood.xs + self.alpha_del) - gammaln(self.alpha_del)
+        alpha_sum = self.alpha_scale + self.n_samples * self.alpha_del
+        self.loglike_const = (
+            self.likelihood.const
+            + gammaln(alpha_sum)
+            - gammaln(self.likelihood.n + alpha_sum)
+        )
+
+    def logprior(self, copies: np.ndarray) -> float:
+        """
+        Log prior of a copy vector, equivalent to `calc_logprior` but using the
+        cached log-probabilities of each copy state
         
-    def run(self, n_iters=50_000):
         """
-        Run the MCMC
+        
+        n_present = copies.sum()
+        return (
+            n_present * self.log_prior_present 
+            + (self.n_samples - n_present) * self.log_prior_del
+        )
+
+    def log_posterior(self, copies: np.ndarray, total: float) -> float:
+        """
+        Unnormalised log posterior of `copies` given the shared abundance total
+        `total = (copies * sample_qualities).sum()`, which samplers update
+        incrementally as barcodes flip rather than recomputing the alphas
+        
+        """
+        
+        if total <= 0:
+            return -np.inf
+        alphas = self.alpha_scale * self.sample_qualities / total + self.alpha_del
+        terms = np.where(
+            copies, 
+            gammaln(self.likelihood.xs + alphas) - gammaln(alphas), 
+            self.terms_del
+        )
+        return self.loglike_const + terms.sum() + self.logprior(copies)
+
+    def _init_storage(self, n_iters: int) -> None:
+        """
+        Allocate storage for the chain according to `self.settings.store`
         
         """
         
-        # Prepare storage
-        # parameters
         self.n_iters = n_iters
-        self.copy_array = np.ones((self.n_iters, self.n_samples))
+        thin = self.settings.thin
+        
+        if self.settings.store == "trace":
+            self.copy_array = np.ones((n_iters, self.n_samples), dtype=np.uint8)
+            self.loglike = np.zeros(n_iters)
+            self.acceptance_rate = np.ones(n_iters)
+            return
+            
+        # Streaming: running sums of post burn-in copy states
+        self.copy_sums = np.zeros(self.n_samples, dtype=np.int64)
+        self.n_kept = 0
+        self.copy_array = None
+        self.loglike = None
+        self.acceptance_rate = None
+        if thin is not None:
+            n_thinned = (n_iters - 1) // thin + 1
+            self.copy_trace = np.zeros(
+                (n_thinned, (self.n_samples + 7) // 8), dtype=np.uint8
+            )
+            self.loglike_trace = np.zeros(n_thinned)
+
+    def _store(self, i: int, copies: np.ndarray, loglike: float) -> None:
+        """
+        Record the state of iteration `i`
+        
+        """
+        
+        if self.settings.store == "trace":
+            self.copy_array[i] = copies
+            self.loglike[i] = loglike
+            self.acceptance_rate[i] = (self.n_accepted + 1) / max(self.n_proposals, 1)
+            return
+        
+        if i >= self.settings.n_burn:
+            self.copy_sums += copies
+            self.n_kept += 1
+        thin = self.settings.thin
+        if thin is not None and i % thin == 0:
+            self.copy_trace[i // thin] = np.packbits(copies)
+            self.loglike_trace[i // thin] = loglike
+        
+    def run(self, n_iters: int | None = None):
+        """
+        Run the MCMC
+        
+        """
         
-        # posterior
-        self.loglike = np.zeros(n_iters)
-        a = 1
-        self.acceptance_rate = np.ones(n_iters)
+        if n_iters is None:
+            n_iters = self.settings.n_iters
+        self._init_storage(n_iters)
         
         # Initialise
         print("Initialising...")
-        i = 0
-        current_copies = self.copy_array[i]  # initialised as all ones
+        self.initialise()
+        self._store(0, self.current_copies, self.current_loglike)
+        
+        # Iterate
+        print(f"Iterating... {n_iters}")
+        if self._use_numba():
+            self._run_numba(n_iters)
+        else:
+            self._prepare_draws(n_iters - 1)
+            step = self._get_step()
+            current_copies, current_loglike = self.current_copies, self.current_loglike
+            for i in range(1, n_iters):
+                current_copies, current_loglike = step(current_copies, current_loglike)
+                self._store(i, current_copies, current_loglike)
+            self.current_copies, self.current_loglike = current_copies, current_loglike
+            self.draws = None
+        print("Done.")
+        print(f"Final acceptance rate: {(self.n_accepted + 1) / max(self.n_proposals, 1)}")
+
+    def initialise(self) -> None:
+        """
+        Set the chain to its starting state, with every barcode present
+        
+        """
+        
+        self.n_accepted = 0
+        self.n_proposals = 0
+        self.current_copies = np.ones(self.n_samples, dtype=np.uint8)
         alphas = get_alphas(
-            current_copies,
+            self.current_copies,
             self.sample_qualities,
             self.error_rate,
             self.sample_dispersion
         )
-        current_loglike = (
-            calc_dirmult_logprob(alphas, self.data) 
-            + calc_logprior(current_copies, self.prior_del)
+        self.current_loglike = (
+            self.likelihood.logprob(alphas) 
+            + self.logprior(self.current_copies)
         )
-        self.loglike[i] = current_loglike
+
+    def sample_chunk(self, n_iters: int) -> np.ndarray:
+        """
+        Advance an initialised chain by `n_iters` without storing a trace and
+        return the sum of the copy states visited
         
-        # Iterate
-        print(f"Iterating... {n_iters}")
-        for i in np.arange(1, self.n_iters):
-            proposal = propose_copies(current_copies)
-            alphas = get_alphas(
-                proposal, 
-                self.sample_qualities,
-                self.error_rate,
-                self.sample_dispersion                   
-            )
-            proposed_loglike = (
-                calc_dirmult_logprob(alphas, xs=self.data)
-                + calc_logprior(proposal, self.prior_del)
+        """
+        
+        sums = np.zeros(self.n_samples, dtype=np.int64)
+        if self._use_numba():
+            self._call_kernel(n_iters, first_kept=0, copy_sums=sums)
+            return sums
+        
+        self._prepare_draws(n_iters)
+        step = self._get_step()
+        current_copies, current_loglike = self.current_copies, self.current_loglike
+        for _ in range(n_iters):
+            current_copies, current_loglike = step(current_copies, current_loglike)
+            sums += current_copies
+        self.current_copies, self.current_loglike = current_copies, current_loglike
+        return sums
+
+    def _use_numba(self) -> bool:
+        s = self.settings
+        if s.sampler != "metropolis" or (s.store == "summary" and s.thin is not None):
+            return False
+        return s.backend == "numba" or (s.backend == "auto" and _metropolis_kernel is not None)
+
+    def _prepare_draws(self, n_iters: int) -> None:
+        """
+        Draw the uniforms for `n_iters` metropolis proposals up front (one to pick
+        the barcode, one to accept), so every engine consumes the same stream
+        
+        """
+        
+        if self.settings.sampler == "metropolis":
+            self.draws = self.rng.random((n_iters, 2))
+            self.draw_ix = 0
+
+    def _call_kernel(
+        self,
+        n_iters: int,
+        first_kept: int,
+        copy_sums: np.ndarray,
+        copy_out: np.ndarray | None = None,
+        loglike_out: np.ndarray | None = None,
+        accepted_out: np.ndarray | None = None,
+    ) -> None:
+        """
+        Advance the chain by `n_iters` proposals with the compiled kernel
+        
+        """
+        
+        if copy_out is None:
+            copy_out = np.empty((0, self.n_samples), dtype=np.uint8)
+            loglike_out = np.empty(0)
+            accepted_out = np.empty(0, dtype=np.int64)
+        copies = self.current_copies.copy()
+        self.current_loglike, n_accepted = _metropolis_kernel(
+            copies,
+            float(self.current_loglike),
+            self.rng.random((n_iters, 2)),
+            self.likelihood.xs,
+            np.asarray(self.sample_qualities, dtype=float),
+            self.terms_del,
+            float(self.alpha_scale),
+            float(self.alpha_del),
+            float(self.loglike_const),
+            float(self.log_prior_present),
+            float(self.log_prior_del),
+            first_kept,
+            copy_out,
+            loglike_out,
+            accepted_out,
+            copy_sums,
+        )
+        self.current_copies = copies
+        self.n_accepted += n_accepted
+        self.n_proposals += n_iters
+
+    def _run_numba(self, n_iters: int) -> None:
+        """
+        Iterations 1 to `n_iters` - 1 of `run` using the compiled kernel
+        
+        """
+        
+        if self.settings.store == "trace":
+            accepted_out = np.empty(n_iters - 1, dtype=np.int64)
+            self._call_kernel(
+                n_iters - 1,
+                first_kept=n_iters,
+                copy_sums=np.zeros(self.n_samples, dtype=np.int64),
+                copy_out=self.copy_array[1:],
+                loglike_out=self.loglike[1:],
+                accepted_out=accepted_out,
             )
-            A = proposed_loglike - current_loglike
-            u = random.random()
-            if np.log(u) < A:
-                current_copies = proposal
-                current_loglike = proposed_loglike
-                a += 1
-            self.copy_array[i] = current_copies
-            self.loglike[i] = current_loglike
-            self.acceptance_rate[i] = a / i
-        print("Done.")
-        print(f"Final acceptance rate: {self.acceptance_rate[i]}")
+            self.acceptance_rate[1:] = (accepted_out + 1) / np.arange(1, n_iters)
+            return
         
-    def compute_posterior(self, n_burn=1_000):
+        # Proposal i of the kernel is iteration i + 1
+        first_kept = max(self.settings.n_burn - 1, 0)
+        self._call_kernel(n_iters - 1, first_kept=first_kept, copy_sums=self.copy_sums)
+        self.n_kept += max(n_iters - 1 - first_kept, 0)
+
+    def _get_step(self):
+        return {
+            "metropolis": self._metropolis_step,
+            "gibbs": self._gibbs_sweep,
+            "block": self._block_step,
+        }[self.settings.sampler]
+
+    def _metropolis_step(
+        self, current_copies: np.ndarray, current_loglike: float
+    ) -> tuple[np.ndarray, float]:
+        """
+        Random-walk Metropolis step flipping a single barcode, using the next
+        pair of uniforms drawn by `_prepare_draws`
+        
+        """
+        
+        u = self.draws[self.draw_ix]
+        self.draw_ix += 1
+        ix = int(u[0] * self.n_samples)
+        proposal = current_copies.copy()
+        proposal[ix] = 1 - proposal[ix]
+        proposed_loglike = self.log_posterior(proposal, proposal @ self.sample_qualities)
+        A = proposed_loglike - current_loglike
+        self.n_proposals += 1
+        if np.log(u[1]) < A:
+            self.n_accepted += 1
+            return proposal, proposed_loglike
+        return current_copies, current_loglike
+
+    def _gibbs_sweep(
+        self, current_copies: np.ndarray, current_loglike: float
+    ) -> tuple[np.ndarray, float]:
+        """
+        Systematic-scan Gibbs sweep: visit every barcode in turn and draw its copy
+        state from the full conditional. The current state's log posterior is
+        already known, so each site costs a single evaluation of the other state
+        
+        """
+        
+        copies = current_copies.copy()
+        total = copies @ self.sample_qualities
+        u = self.rng.random(self.n_samples)
+        for ix in range(self.n_samples):
+            q = self.sample_qualities[ix]
+            flipped_total = total - q if copies[ix] else total + q
+            copies[ix] = 1 - copies[ix]
+            flipped_loglike = self.log_posterior(copies, flipped_total)
+            # Probability of the flipped state under the full conditional
+            p_flip = expit(flipped_loglike - current_loglike)
+            self.n_proposals += 1
+            if u[ix] < p_flip:
+                total = flipped_total
+                current_loglike = flipped_loglike
+                self.n_accepted += 1
+            else:
+                copies[ix] = 1 - copies[ix]
+        return copies, current_loglike
+
+    def _block_step(
+        self, current_copies: np.ndarray, current_loglike: float
+    ) -> tuple[np.ndarray, float]:
+        """
+        Blocked Metropolis step flipping a random subset of barcodes, of size
+        1 + Poisson(n_flips - 1). The proposal is symmetric so the Hastings
+        ratio is 1
+        
+        """
+        
+        n_flip = min(1 + self.rng.poisson(self.settings.n_flips - 1), self.n_samples)
+        ixs = self.rng.choice(self.n_samples, size=n_flip, replace=False)
+        proposal = current_copies.copy()
+        proposal[ixs] = 1 - proposal[ixs]
+        total = proposal @ self.sample_qualities
+        proposed_loglike = self.log_posterior(proposal, total)
+        self.n_proposals += 1
+        if np.log(self.rng.random()) < proposed_loglike - current_loglike:
+            self.n_accepted += 1
+            return proposal, proposed_loglike
+        return current_copies, current_loglike
+
+    def find_map(self, max_sweeps: int = 100) -> tuple[np.ndarray, float]:
+        """
+        Find the maximum a posteriori copy vector by iterated conditional modes:
+        starting with every barcode present, sweep the barcodes and set each to
+        its most probable state given the others until a sweep changes nothing.
+        This finds a local mode, which is the global one for well separated plates
+        
+        """
+        
+        copies = np.ones(self.n_samples, dtype=np.uint8)
+        total = copies @ self.sample_qualities
+        current_loglike = self.log_posterior(copies, total)
+        for _ in range(max_sweeps):
+            changed = False
+            for ix in range(self.n_samples):
+                q = self.sample_qualities[ix]
+                flipped_total = total - q if copies[ix] else total + q
+                copies[ix] = 1 - copies[ix]
+                flipped_loglike = self.log_posterior(copies, flipped_total)
+                if flipped_loglike > current_loglike:
+                    total, current_loglike = flipped_total, flipped_loglike
+                    changed = True
+                else:
+                    copies[ix] = 1 - copies[ix]
+            if not changed:
+                break
+        return copies, current_loglike
+
+    def conditional_posterior(self, copies: np.ndarray) -> np.ndarray:
+        """
+        Probability that each barcode is deleted given all others are fixed at
+        `copies`, a mean-field style approximation of the posterior around a mode
+        
+        """
+        
+        copies = copies.copy()
+        total = copies @ self.sample_qualities
+        loglike = self.log_posterior(copies, total)
+        posterior = np.zeros(self.n_samples)
+        for ix in range(self.n_samples):
+            q = self.sample_qualities[ix]
+            flipped_total = total - q if copies[ix] else total + q
+            copies[ix] = 1 - copies[ix]
+            flipped_loglike = self.log_posterior(copies, flipped_total)
+            copies[ix] = 1 - copies[ix]
+            # log odds of deleted vs present
+            log_odds = loglike - flipped_loglike if copies[ix] == 0 else flipped_loglike - loglike
+            posterior[ix] = expit(log_odds)
+        return posterior
+
+    def thinned_copies(self) -> np.ndarray:
+        """
+        Unpack the thinned trace of copy states kept in "summary" mode
+        
+        """
+        
+        return np.unpackbits(self.copy_trace, axis=1, count=self.n_samples)
+        
+    def compute_posterior(self, n_burn: int | None = None):
         """
         Compute the posterior probabilities
         
         """
-        self.posterior_deleted = (1 - self.copy_array[n_burn:].mean(0))
+        
+        if n_burn is None:
+            n_burn = self.settings.n_burn
+            
+        if self.settings.store == "trace":
+            self.posterior_deleted = (1 - self.copy_array[n_burn:].mean(0))
+            return self.posterior_deleted
+        
+        if n_burn != self.settings.n_burn:
+            raise ValueError(
+                f"Chain was accumulated with n_burn={self.settings.n_burn}, "
+                f"re-run with the new burn-in to use n_burn={n_burn}"
+            )
+        self.posterior_deleted = 1 - self.copy_sums / self.n_kept
         return self.posterior_deleted
 
 
+# --------------------------------------------------------------------------------
+# Convergence diagnostics
+#
+# --------------------------------------------------------------------------------
+
+
+def calc_split_rhat(seq_sums: np.ndarray, n_draws: int) -> np.ndarray:
+    """
+    Split-R-hat per barcode from the copy state sums of each half-chain
+
+    `seq_sums` has shape (n_sequences, n_samples), where each sequence is half of a
+    chain containing `n_draws` states. As copy states are binary the within
+    sequence variance follows directly from the sequence means
+    
+    """
+    
+    means = seq_sums / n_draws
+    W = (means * (1 - means) * n_draws / (n_draws - 1)).mean(0)
+    B = n_draws * means.var(0, ddof=1)
+    var_plus = (n_draws - 1) / n_draws * W + B / n_draws
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rhat = np.sqrt(var_plus / W)
+    rhat[(W == 0) & (B == 0)] = 1.0
+    return rhat
+
+
+def calc_batch_ess(chunk_sums: np.ndarray, chunk_size: int) -> np.ndarray:
+    """
+    Effective sample size per barcode using batch means, with each chunk of
+    `chunk_size` iterations as a batch
+
+    `chunk_sums` has shape (n_chains, n_chunks, n_samples). ESS is summed across
+    chains; barcodes that never changed state are given the total number of draws
+    
+    """
+    
+    n_chains, n_chunks, _ = chunk_sums.shape
+    n_draws = n_chunks * chunk_size
+    batch_means = chunk_sums / chunk_size
+    chain_means = batch_means.mean(1)
+    var = chain_means * (1 - chain_means)
+    var_batch = chunk_size * batch_means.var(1, ddof=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ess = n_draws * var / var_batch
+    ess[var_batch == 0] = n_draws
+    return np.minimum(ess, n_draws).sum(0)
+
+
+class AdaptiveDeletionMCMC:
+    """
+    Several `DeletionMCMC` chains for one target, run in chunks until the
+    posterior is stable. Exposes the same `run`/`compute_posterior` interface
+    as a single chain, plus the diagnostics `ess`, `rhat` and `converged`
+    """
+
+    def __init__(self, mcmcs: list[DeletionMCMC]):
+        self.mcmcs = mcmcs
+        self.target_gene = mcmcs[0].target_gene
+        self.settings = mcmcs[0].settings
+        self.n_samples = mcmcs[0].n_samples
+
+    def run(self) -> None:
+        """
+        Run all chains chunk by chunk, checking convergence after each chunk
+        
+        """
+        
+        s = self.settings
+        max_chunks = max(s.n_iters // s.chunk_size, 8)
+        chunk_sums = np.zeros((len(self.mcmcs), max_chunks, self.n_samples), dtype=np.int64)
+        previous = None
+        self.converged = False
+        
+        print(f"Running {len(self.mcmcs)} chains adaptively (max {max_chunks * s.chunk_size})...")
+        for mcmc in self.mcmcs:
+            mcmc.initialise()
+        for k in range(max_chunks):
+            for c, mcmc in enumerate(self.mcmcs):
+                chunk_sums[c, k] = mcmc.sample_chunk(s.chunk_size)
+            n_chunks = k + 1
+            if n_chunks < 8:
+                continue
+            
+            self._compute_diagnostics(chunk_sums[:, :n_chunks])
+            if previous is not None:
+                stable = np.abs(self.posterior_deleted - previous).max() < s.tol
+                self.converged = bool(
+                    stable
+                    and self.rhat.max() < s.max_rhat
+                    and self.ess.min() >= s.min_ess
+                )
+            if self.converged:
+                break
+            previous = self.posterior_deleted
+        
+        self.n_iters = n_chunks * s.chunk_size
+        status = "Converged" if self.converged else "Did not converge"
+        print(f"{status} after {self.n_iters} iterations per chain.")
+        print(f"Max R-hat: {self.rhat.max():.3f}, min ESS: {self.ess.min():.0f}")
+
+    def _compute_diagnostics(self, chunk_sums: np.ndarray) -> None:
+        """
+        Posterior and diagnostics from the second half of each chain's chunks
+        
+        """
+        
+        chunk_size = self.settings.chunk_size
+        n_chunks = chunk_sums.shape[1]
+        n_half = n_chunks // 4
+        kept = chunk_sums[:, n_chunks - 2 * n_half:]
+        
+        self.posterior_deleted = 1 - kept.sum((0, 1)) / (kept.shape[0] * kept.shape[1] * chunk_size)
+        seq_sums = np.concatenate([kept[:, :n_half].sum(1), kept[:, n_half:].sum(1)])
+        self.rhat = calc_split_rhat(seq_sums, n_half * chunk_size)
+        self.ess = calc_batch_ess(kept, chunk_size)
+
+    def compute_posterior(self, n_burn: int | None = None) -> np.ndarray:
+        """
+        Posterior probabilities, burn-in having been set adaptively during `run`
+        
+        """
+        
+        return self.posterior_deleted
+
+
+# --------------------------------------------------------------------------------
+# Batched engine
+#
+# --------------------------------------------------------------------------------
+
+
+class BatchedDeletionMCMC:
+    """
+    Advance many independent Metropolis chains together as one chains x samples
+    array, so the per-iteration Python overhead is paid once for the batch rather
+    than once per chain
+
+    Chains can come from different experiments, targets or seeds; shorter chains
+    are padded and masked. Each chain still draws its random numbers from its own
+    generator, in blocks of `block_size` iterations, so its result does not depend
+    on which other chains share the batch. Only the streaming posterior is kept,
+    so every chain must use "summary" storage without thinning, and all chains
+    share one `n_iters` and `n_burn`
+    """
+
+    def __init__(self, mcmcs: list[DeletionMCMC], block_size: int = 1_000):
+        for mcmc in mcmcs:
+            s = mcmc.settings
+            if s.sampler != "metropolis":
+                raise ValueError("The batched engine only supports the metropolis sampler")
+            if s.store != "summary" or s.thin is not None:
+                raise ValueError(
+                    "The batched engine keeps no trace, use store='summary' without thin"
+                )
+            if s.backend == "numba":
+                raise ValueError("The batched engine runs in numpy, use backend='python' or 'auto'")
+        if len({(m.settings.n_iters, m.settings.n_burn) for m in mcmcs}) > 1:
+            raise ValueError("Chains run as one batch must share n_iters and n_burn")
+        self.mcmcs = mcmcs
+        self.block_size = block_size
+        
+        n_chains = len(mcmcs)
+        self.n_valid = np.array([m.n_samples for m in mcmcs])
+        n_max = self.n_valid.max()
+        self.mask = np.arange(n_max) < self.n_valid[:, None]
+        
+        # Per-barcode terms, padded with zeros
+        self.xs = np.zeros((n_chains, n_max))
+        self.qualities = np.zeros((n_chains, n_max))
+        self.terms_del = np.zeros((n_chains, n_max))
+        for c, m in enumerate(mcmcs):
+            self.xs[c, :m.n_samples] = m.likelihood.xs
+            self.qualities[c, :m.n_samples] = m.sample_qualities
+            self.terms_del[c, :m.n_samples] = m.terms_del
+        
+        # Per-chain scalars
+        self.alpha_scale = np.array([m.alpha_scale for m in mcmcs])[:, None]
+        self.alpha_del = np.array([m.alpha_del for m in mcmcs])[:, None]
+        self.loglike_const = np.array([m.loglike_const for m in mcmcs])
+        self.log_prior_present = np.array([m.log_prior_present for m in mcmcs])
+        self.log_prior_del = np.array([m.log_prior_del for m in mcmcs])
+
+    def log_posterior(self, copies: np.ndarray, totals: np.ndarray) -> np.ndarray:
+        """
+        Log posterior of every chain, as `DeletionMCMC.log_posterior`
+        
+        """
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            alphas = self.alpha_scale * self.qualities / totals[:, None] + self.alpha_del
+            terms = np.where(
+                copies & self.mask,
+                gammaln(self.xs + alphas) - gammaln(alphas),
+                self.terms_del,
+            ).sum(1)
+        n_present = copies.sum(1)
+        logprior = (
+            n_present * self.log_prior_present
+            + (self.n_valid - n_present) * self.log_prior_del
+        )
+        loglike = self.loglike_const + terms + logprior
+        loglike[totals <= 0] = -np.inf
+        return loglike
+
+    def run(self, n_iters: int | None = None, n_burn: int | None = None) -> list[DeletionMCMC]:
+        """
+        Run every chain and store the posterior on each `DeletionMCMC`
+        
+        """
+        
+        settings = self.mcmcs[0].settings
+        n_iters = settings.n_iters if n_iters is None else n_iters
+        n_burn = settings.n_burn if n_burn is None else n_burn
+        if n_burn >= n_iters:
+            raise ValueError(f"n_burn ({n_burn}) must be smaller than n_iters ({n_iters})")
+        n_chains = len(self.mcmcs)
+        rows = np.arange(n_chains)
+        
+        copies = self.mask.astype(np.uint8)
+        totals = (copies * self.qualities).sum(1)
+        current = self.log_posterior(copies, totals)
+        copy_sums = np.zeros(copies.shape, dtype=np.int64)
+        n_kept = 0
+        n_accepted = np.zeros(n_chains, dtype=np.int64)
+        if n_burn == 0:
+            copy_sums += copies
+            n_kept += 1
+        
+        print(f"Iterating {n_chains} chains... {n_iters}")
+        for start in range(1, n_iters, self.block_size):
+            n_block = min(self.block_size, n_iters - start)
+            u = np.stack([m.rng.random((n_block, 2)) for m in self.mcmcs], axis=1)
+            ixs = (u[:, :, 0] * self.n_valid).astype(np.intp)
+            log_u = np.log(u[:, :, 1])
+            for b in range(n_block):
+                ix = ixs[b]
+                flipped = copies[rows, ix]
+                copies[rows, ix] = 1 - flipped
+                proposed_totals = totals + np.where(flipped, -1, 1) * self.qualities[rows, ix]
+                proposed = self.log_posterior(copies, proposed_totals)
+                accept = log_u[b] < proposed - current
+                
+                # Revert rejected chains
+                reject = ~accept
+                copies[rows[reject], ix[reject]] = flipped[reject]
+                totals = np.where(accept, proposed_totals, totals)
+                current = np.where(accept, proposed, current)
+                n_accepted += accept
+                if start + b >= n_burn:
+                    copy_sums += copies
+                    n_kept += 1
+        
+        for c, mcmc in enumerate(self.mcmcs):
+            n = mcmc.n_samples
+            mcmc.n_iters = n_iters
+            mcmc.n_accepted = int(n_accepted[c])
+            mcmc.n_proposals = n_iters - 1
+            mcmc.copy_sums = copy_sums[c, :n]
+            mcmc.n_kept = n_kept
+            mcmc.current_copies = copies[c, :n].copy()
+            mcmc.current_loglike = current[c]
+            mcmc.posterior_deleted = 1 - mcmc.copy_sums / n_kept
+        print("Done.")
+        return self.mcmcs
+
+
+# --------------------------------------------------------------------------------
+# Joint multi-target sampling
+#
+# --------------------------------------------------------------------------------
+
+
+@dataclass
+class TargetPosterior:
+    target_gene: str
+    posterior_deleted: np.ndarray
+
+
+class JointDeletionMCMC:
+    """
+    Sample the deletion status of several targets in a single Metropolis chain
+
+    All targets on a plate share the sample qualities, error rate and dispersion,
+    so the quality-weighted terms and the priors are computed once and every
+    iteration proposes one flip per target, scoring all targets with a single
+    samples x targets array call. Targets are independent given the
+    hyperparameters, so accepting each target's flip separately samples each
+    target's posterior exactly as its own chain would. Only the streaming
+    posterior is kept, so `settings` must use "summary" storage without
+    thinning and a single, non-adaptive chain
+    """
+
+    def __init__(self,
+                 read_counts_df: pd.DataFrame,
+                 target_genes: list[str],
+                 sample_qualities: np.ndarray,
+                 sample_dispersion: float,
+                 error_rate: float,
+                 prior_del: float = 0.5,
+                 seed: int | np.random.SeedSequence | None = None,
+                 settings: SamplerSettings | None = None,
+                ):
+        self.target_genes = list(target_genes)
+        self.data = read_counts_df[self.target_genes].to_numpy(dtype=float)
+        self.n_samples, self.n_targets = self.data.shape
+        self.sample_qualities = np.asarray(sample_qualities, dtype=float)
+        self.rng = np.random.default_rng(seed)
+        self.settings = settings if settings is not None else SamplerSettings()
+        if self.settings.sampler != "metropolis":
+            raise ValueError("Joint sampling only supports the metropolis sampler")
+        if self.settings.adaptive:
+            raise ValueError("Adaptive runs cannot be combined with joint sampling")
+        if self.settings.store != "summary" or self.settings.thin is not None:
+            raise ValueError("Joint sampling keeps no trace, use store='summary' without thin")
+        if self.settings.backend == "numba":
+            raise ValueError("Joint sampling runs in numpy, use backend='python' or 'auto'")
+
+        # Terms shared by every target
+        self.alpha_del = sample_dispersion * error_rate
+        self.weighted_qualities = (
+            sample_dispersion * (1 - 2 * error_rate) * self.sample_qualities
+        )[:, None]
+        self.log_prior_del = np.log(prior_del)
+        self.log_prior_present = np.log(1 - prior_del)
+        alpha_sum = sample_dispersion * (1 - 2 * error_rate) + self.n_samples * self.alpha_del
+
+        # Terms that depend on each target's counts only. The likelihood is
+        # written relative to every barcode being deleted, so a present barcode
+        # adds its difference from `terms_del`
+        n = self.data.sum(0)
+        self.terms_del = gammaln(self.data + self.alpha_del) - gammaln(self.alpha_del)
+        self.loglike_const = (
+            gammaln(n + 1) - gammaln(self.data + 1).sum(0)
+            + gammaln(alpha_sum) - gammaln(n + alpha_sum)
+            + self.terms_del.sum(0) + self.n_samples * self.log_prior_del
+        )
+        self.log_prior_ratio = self.log_prior_present - self.log_prior_del
+
+    def log_posterior(self, copies: np.ndarray, totals: np.ndarray) -> np.ndarray:
+        """
+        Log posterior of each target's copy vector (the columns of `copies`)
+        
+        """
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            alphas = self.weighted_qualities / totals + self.alpha_del
+            terms = gammaln(self.data + alphas) - gammaln(alphas) - self.terms_del
+            loglike = self.loglike_const + (copies * (terms + self.log_prior_ratio)).sum(0)
+        if (totals <= 0).any():
+            loglike[totals <= 0] = -np.inf
+        return loglike
+
+    def run(self, n_iters: int | None = None, n_burn: int | None = None) -> None:
+        """
+        Run the joint chain
+        
+        """
+        
+        n_iters = self.settings.n_iters if n_iters is None else n_iters
+        n_burn = self.settings.n_burn if n_burn is None else n_burn
+        if n_burn >= n_iters:
+            raise ValueError(f"n_burn ({n_burn}) must be smaller than n_iters ({n_iters})")
+        q = self.sample_qualities
+        
+        copies = np.ones((self.n_samples, self.n_targets))
+        flat_copies = copies.reshape(-1)
+        totals = q @ copies
+        current = self.log_posterior(copies, totals)
+        self.n_accepted = np.zeros(self.n_targets, dtype=np.int64)
+
+        # Rather than adding the whole state every iteration, credit a barcode
+        # with the iterations it spent present whenever it flips
+        first_kept = n_burn
+        self.n_kept = n_iters - first_kept
+        self.copy_sums = np.zeros(copies.shape, dtype=np.int64)
+        since = np.full(copies.shape, first_kept, dtype=np.int64)
+        
+        print(f"Iterating {self.n_targets} targets... {n_iters}")
+        u = self.rng.random((n_iters - 1, self.n_targets, 2))
+        ixs = (u[:, :, 0] * self.n_samples).astype(np.intp)
+        log_u = np.log(u[:, :, 1])
+        # Each target's proposed barcode as an index into the flattened state
+        flat_ixs = ixs * self.n_targets + np.arange(self.n_targets)
+        q_ixs = q[ixs]
+        flat_sums = self.copy_sums.reshape(-1)
+        flat_since = since.reshape(-1)
+        for i in range(1, n_iters):
+            flat = flat_ixs[i - 1]
+            flipped = flat_copies[flat]
+            flat_copies[flat] = 1 - flipped
+            proposed_totals = totals + (1 - 2 * flipped) * q_ixs[i - 1]
+            proposed = self.log_posterior(copies, proposed_totals)
+            accept = log_u[i - 1] < proposed - current
+            if accept.all():
+                totals, current = proposed_totals, proposed
+            else:
+                # Revert rejected targets
+                reject = ~accept
+                flat_copies[flat[reject]] = flipped[reject]
+                if not accept.any():
+                    continue
+                totals = np.where(accept, proposed_totals, totals)
+                current = np.where(accept, proposed, current)
+                flat, flipped = flat[accept], flipped[accept]
+            self.n_accepted += accept
+            if i > first_kept:
+                flat_sums[flat] += (flipped * (i - flat_since[flat])).astype(np.int64)
+                flat_since[flat] = i
+        self.copy_sums += (copies * (n_iters - since)).astype(np.int64)
+        print("Done.")
+        
+        self.posterior_deleted = 1 - self.copy_sums / self.n_kept
+
+    def target_posteriors(self) -> list[TargetPosterior]:
+        """
+        Per-target results, in the form `DeletionFinder.summarise_mcmc_outputs` reads
+        
+        """
+        
+        return [
+            TargetPosterior(target_gene, self.posterior_deleted[:, t])
+            for t, target_gene in enumerate(self.target_genes)
+        ]
+
+
+# --------------------------------------------------------------------------------
+# Parallel execution
+#
+# --------------------------------------------------------------------------------
+
+
+def _run_chain(mcmc: DeletionMCMC) -> DeletionMCMC:
+    """
+    Run a single chain and compute its posterior, used as the process pool task
+    
+    """
+    
+    mcmc.run()
+    mcmc.compute_posterior()
+    return mcmc
+
+
+def _run_batch(mcmcs: list[DeletionMCMC]) -> list[DeletionMCMC]:
+    """
+    Run a group of chains with the batched engine, used as the process pool task
+    
+    """
+    
+    return BatchedDeletionMCMC(mcmcs).run()
+
+
+def run_chains(
+    mcmcs: list[DeletionMCMC], n_jobs: int = 1, batched: bool = False
+) -> list[DeletionMCMC]:
+    """
+    Run a list of chains, spreading them over a process pool when `n_jobs` > 1
+    (-1 uses all available cores). Chains are returned in the order given
+
+    With `batched`, chains sharing `n_iters` and `n_burn` are split into one
+    group per process and each group is advanced together by `BatchedDeletionMCMC`
+    
+    """
+    
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(mcmcs))
+    
+    if batched:
+        if any(isinstance(m, AdaptiveDeletionMCMC) for m in mcmcs):
+            raise ValueError("Adaptive runs cannot be combined with the batched engine")
+        by_length = {}
+        for i, m in enumerate(mcmcs):
+            by_length.setdefault((m.settings.n_iters, m.settings.n_burn), []).append(i)
+        groups = [
+            ixs[split]
+            for ixs in map(np.array, by_length.values())
+            for split in np.array_split(np.arange(len(ixs)), max(n_jobs, 1))
+            if len(split)
+        ]
+        if n_jobs <= 1:
+            results = [_run_batch([mcmcs[i] for i in ixs]) for ixs in groups]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                results = list(pool.map(_run_batch, [[mcmcs[i] for i in ixs] for ixs in groups]))
+        # Put the chains back in the order given
+        ordered = [None] * len(mcmcs)
+        for ixs, group in zip(groups, results):
+            for i, m in zip(ixs, group):
+                ordered[i] = m
+        return ordered
+    
+    if n_jobs <= 1:
+        return [_run_chain(mcmc) for mcmc in mcmcs]
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        return list(pool.map(_run_chain, mcmcs))
+
+
 # --------------------------------------------------------------------------------
 # Deletion Finder using Bayesian MCMC
 #
@@ -219,7 +1231,8 @@ class DeletionFinder:
     """
 
     def __init__(self, df_bedcov: pd.DataFrame,
-                 deleted_amplicons: list[str] = AMPLICONS_DEL_MVP) -> None:
+                 deleted_amplicons: list[str] = AMPLICONS_DEL_MVP,
+                 settings: SamplerSettings | None = None) -> None:
         """
         Initialise the deletion finder and preprocess for MCMC
         """
@@ -236,11 +1249,136 @@ class DeletionFinder:
 
         # Parameters
         self.hyperparams = None
+        self.negative_barcodes = []
+        self.settings = settings if settings is not None else SamplerSettings()
 
         # Store MCMC results
         self.mcmcs = []
         self.df_summary = None
 
+    @classmethod
+    def from_combined(
+        cls,
+        df_bedcov: pd.DataFrame,
+        negative_barcodes: dict[str, list[str]],
+        deleted_amplicons: list[str] = AMPLICONS_DEL_MVP,
+        control_amplicons: list[str] = AMPLICONS_CONTROL_MVP,
+        settings: SamplerSettings | None = None,
+        min_reads: float = 100,
+        min_pct_pass: float = 0.7,
+    ) -> dict[str, "DeletionFinder"]:
+        """
+        Build a finder for every experiment in a workspace from one long BED
+        coverage table with an `expt_name` column
+
+        The coverage is pivoted and normalised for all experiments in a single
+        grouped pass and the hyperparameters are estimated for every experiment
+        at once, giving the same finders (up to floating point rounding) as
+        constructing each one separately and calling `estimate_hyperparameters`.
+        `negative_barcodes` maps each
+        experiment name to its negative control barcodes, and must cover every
+        experiment in `df_bedcov`
+        """
+
+        df_bedcov = df_bedcov.query("barcode != 'unclassified'")
+        missing = sorted(set(df_bedcov["expt_name"]) - set(negative_barcodes))
+        if missing:
+            raise ValueError(
+                f"No negative control barcodes given for experiments: {', '.join(map(str, missing))}"
+            )
+        keys = ["expt_name", "barcode"]
+
+        # Mean coverage and normalised coverage for all experiments at once
+        mean_cov = pd.pivot_table(
+            index=keys, columns="name", values="mean_cov", data=df_bedcov, observed=True
+        )
+        norm_cov = mean_cov / mean_cov.groupby(level="expt_name", observed=True).transform("sum")
+        expt_of_row = mean_cov.index.get_level_values("expt_name")
+
+        # Control amplicons passing coverage in each experiment
+        controls = df_bedcov[df_bedcov["name"].isin(control_amplicons)]
+        pct_passing = (
+            controls["n_reads"]
+            .ge(min_reads)
+            .groupby([controls["expt_name"], controls["name"]], observed=True)
+            .mean()
+            .unstack()
+            .reindex(columns=norm_cov.columns)
+        )
+        passed = (pct_passing >= min_pct_pass).reindex(expt_of_row).to_numpy()
+
+        # Sample qualities over each experiment's passing amplicons
+        passed_cov = np.where(passed, norm_cov.to_numpy(), np.nan)
+        n_passed = passed.sum(1)
+        qual_mean = np.nansum(passed_cov, 1) / n_passed
+        qual_var = np.nansum((passed_cov - qual_mean[:, None]) ** 2, 1) / n_passed
+
+        # Overdispersion, excluding the last barcode of each experiment as
+        # `scale_estimator` does
+        log_terms = pd.Series(
+            np.log(qual_mean * (1 - qual_mean) / qual_var - 1), index=expt_of_row
+        )
+        is_last = ~expt_of_row.duplicated(keep="last")
+        grouped_terms = log_terms.where(~is_last, 0).groupby(level=0, sort=False, observed=True)
+        scales = np.exp(grouped_terms.sum() / (grouped_terms.size() - 1))
+
+        # Misclassification rate from each experiment's negative controls
+        neg_index = pd.MultiIndex.from_tuples(
+            [(expt, bc) for expt, bcs in negative_barcodes.items() for bc in bcs],
+            names=keys,
+        )
+        neg_cov = norm_cov.loc[neg_index]
+        neg_grouped = neg_cov.groupby(level="expt_name", sort=False, observed=True)
+        error_rates = neg_grouped.sum().sum(1) / neg_grouped.count().sum(1)
+
+        # Split into per-experiment finders
+        qual_means = pd.Series(qual_mean, index=expt_of_row)
+        finders = {}
+        for expt_name, expt_bedcov in df_bedcov.groupby("expt_name", sort=False, observed=True):
+            expt_mean_cov = mean_cov.xs(expt_name).dropna(axis=1, how="all")
+            finder = cls._from_frames(
+                expt_bedcov,
+                expt_mean_cov,
+                norm_cov.xs(expt_name)[expt_mean_cov.columns],
+                deleted_amplicons,
+                settings,
+            )
+            finder.control_amplicons = control_amplicons
+            finder.negative_barcodes = list(negative_barcodes[expt_name])
+            finder.hyperparams = ModelHyperParameters(
+                error_rate=error_rates[expt_name],
+                sample_qualities=qual_means[expt_name].to_numpy(),
+                sample_dispersion=scales[expt_name],
+            )
+            finders[expt_name] = finder
+
+        return finders
+
+    @classmethod
+    def _from_frames(
+        cls,
+        df_bedcov: pd.DataFrame,
+        df_mean_cov: pd.DataFrame,
+        df_norm_cov: pd.DataFrame,
+        deleted_amplicons: list[str],
+        settings: SamplerSettings | None,
+    ) -> "DeletionFinder":
+        """
+        Create a finder from already reshaped coverage, skipping the pivot in `__init__`
+        """
+
+        finder = cls.__new__(cls)
+        finder.df_bedcov = df_bedcov
+        finder.deleted_amplicons = deleted_amplicons
+        finder.df_mean_cov = df_mean_cov
+        finder.df_norm_cov = df_norm_cov
+        finder.hyperparams = None
+        finder.negative_barcodes = []
+        finder.settings = settings if settings is not None else SamplerSettings()
+        finder.mcmcs = []
+        finder.df_summary = None
+        return finder
+
     def _create_mean_cov_dataframe(self) -> pd.DataFrame:
         """
         Reshape BED coverage such that barcodes are rows, amplicons are columns,
@@ -248,7 +1386,8 @@ class DeletionFinder:
         """
 
         return pd.pivot_table(
-            index="barcode", columns="name", values="mean_cov", data=self.df_bedcov
+            index="barcode", columns="name", values="mean_cov", data=self.df_bedcov,
+            observed=True,
         )
 
     def _normalise_mean_cov_dataframe(self) -> pd.DataFrame:
@@ -274,6 +1413,7 @@ class DeletionFinder:
         """
         
         self.control_amplicons = control_amplicons
+        self.negative_barcodes = list(negative_barcodes)
         passed_amplicons = self.get_amplicons_passing()
 
         # Estimate misclassification rate
@@ -302,28 +1442,181 @@ class DeletionFinder:
         df = self.df_bedcov[self.df_bedcov["name"].isin(self.control_amplicons)]
         pct_passing = (df["n_reads"]
                        .ge(min_reads)
-                       .groupby(self.df_bedcov["name"])
+                       .groupby(self.df_bedcov["name"], observed=True)
                        .mean()
                        )
         
         return list(pct_passing[pct_passing >= min_pct_pass].index)
         
 
-    def run_mcmc(self, target_gene: str, prior_del: float = 0.5) -> None:
-        """
-        Run a deletion MCMC and store the results
-        """
+    def _create_mcmc(
+        self, target_gene: str, prior_del: float, seed: int | np.random.SeedSequence | None
+    ) -> DeletionMCMC | AdaptiveDeletionMCMC:
+        if self.settings.adaptive:
+            if not isinstance(seed, np.random.SeedSequence):
+                seed = np.random.SeedSequence(seed)
+            return AdaptiveDeletionMCMC([
+                self._create_chain(target_gene, prior_del, s)
+                for s in seed.spawn(self.settings.n_chains)
+            ])
+        return self._create_chain(target_gene, prior_del, seed)
 
-        mcmc = DeletionMCMC(
+    def _create_chain(
+        self, target_gene: str, prior_del: float, seed: int | np.random.SeedSequence | None
+    ) -> DeletionMCMC:
+        return DeletionMCMC(
             self.df_mean_cov,
             target_gene=target_gene,
             prior_del=prior_del,
+            seed=seed,
+            settings=self.settings,
             **self.hyperparams.__dict__,
         )
+
+    def run_mcmc(
+        self, target_gene: str, prior_del: float = 0.5, seed: int | None = None
+    ) -> None:
+        """
+        Run a deletion MCMC and store the results
+        """
+
+        mcmc = self._create_mcmc(target_gene, prior_del, seed)
         mcmc.run()
         mcmc.compute_posterior()
         self.mcmcs.append(mcmc)
 
+    def create_mcmcs(
+        self, prior_del: float = 0.5, seed: int | np.random.SeedSequence | None = None
+    ) -> list[DeletionMCMC]:
+        """
+        Create one chain per deleted amplicon, each seeded from its own child of `seed`
+        """
+
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        seeds = seed.spawn(len(self.deleted_amplicons))
+        return [
+            self._create_mcmc(target_gene, prior_del, s)
+            for target_gene, s in zip(self.deleted_amplicons, seeds)
+        ]
+
+    def run_all(
+        self,
+        n_jobs: int = 1,
+        prior_del: float = 0.5,
+        seed: int | np.random.SeedSequence | None = None,
+        batched: bool = False,
+        cache: ResultCache | None = None,
+    ) -> pd.DataFrame:
+        """
+        Run the MCMC for every deleted amplicon, in parallel across `n_jobs`
+        processes, and return the summarised outputs. If a `cache` is given and
+        already holds the outputs for these inputs, they are returned directly.
+        Unseeded runs are never cached, as they are not meant to be repeated
+        """
+
+        if seed is None:
+            cache = None
+        key = self.cache_key(prior_del, seed)
+        if cache is not None:
+            # An unreadable entry is recomputed and overwritten below
+            cached = cache.get(key)
+            if cached is not None:
+                self.df_summary = cached
+                return self.df_summary
+
+        self.mcmcs = run_chains(
+            self.create_mcmcs(prior_del, seed), n_jobs=n_jobs, batched=batched
+        )
+        self.summarise_mcmc_outputs()
+        if cache is not None:
+            cache.set(key, self.df_summary)
+        return self.df_summary
+
+    def run_joint(
+        self, prior_del: float = 0.5, seed: int | np.random.SeedSequence | None = None
+    ) -> pd.DataFrame:
+        """
+        Sample every deleted amplicon in one joint chain and return the
+        summarised outputs, in the same layout as `run_all`. The finder's
+        settings must suit `JointDeletionMCMC` (store="summary", not adaptive)
+        """
+
+        joint = JointDeletionMCMC(
+            self.df_mean_cov,
+            target_genes=self.deleted_amplicons,
+            prior_del=prior_del,
+            seed=seed,
+            settings=self.settings,
+            **self.hyperparams.__dict__,
+        )
+        joint.run()
+        self.mcmcs = joint.target_posteriors()
+        return self.summarise_mcmc_outputs()
+
+    def cache_key(self, prior_del: float, seed, *extra) -> str:
+        """
+        Hash of everything that determines the deletion calls: the filtered
+        coverage, hyperparameters, targets, prior, sampler settings and seed
+        """
+
+        if isinstance(seed, np.random.SeedSequence):
+            seed = (seed.entropy, seed.spawn_key)
+        return hash_inputs(
+            "deletion-finder-v1",
+            self.df_bedcov,
+            self.hyperparams,
+            list(self.deleted_amplicons),
+            prior_del,
+            self.settings,
+            seed,
+            *extra,
+        )
+
+    def fast_call(
+        self, target_gene: str, prior_del: float = 0.5, ambiguity: float = 0.05
+    ) -> pd.DataFrame:
+        """
+        Quickly call deletions for one target without MCMC, from the MAP copy
+        vector under the same model and the conditional deletion probability of
+        each barcode at that mode
+
+        Barcodes with an approximate posterior between `ambiguity` and
+        1 - `ambiguity` are flagged as ambiguous; plates with any such barcode
+        should be confirmed with the full MCMC. Negative controls carry no
+        information on deletions so are never flagged
+        """
+
+        mcmc = self._create_chain(target_gene, prior_del, seed=None)
+        copies, _ = mcmc.find_map()
+        posterior = mcmc.conditional_posterior(copies)
+        ambiguous = (
+            (posterior > ambiguity) 
+            & (posterior < 1 - ambiguity) 
+            & ~self.df_mean_cov.index.isin(self.negative_barcodes)
+        )
+
+        short_name = target_gene.split("-")[0]
+        return pd.DataFrame({
+            "barcode": self.df_mean_cov.index,
+            f"{short_name}_del_posterior": posterior,
+            f"{short_name}_del_prediction": copies == 0,
+            f"{short_name}_del_ambiguous": ambiguous,
+        })
+
+    def fast_call_all(self, prior_del: float = 0.5, ambiguity: float = 0.05) -> pd.DataFrame:
+        """
+        Run `fast_call` for every deleted amplicon, laid out like `summarise_mcmc_outputs`
+        """
+
+        df = pd.DataFrame({"barcode": self.df_mean_cov.index})
+        for target_gene in self.deleted_amplicons:
+            df = df.merge(
+                self.fast_call(target_gene, prior_del, ambiguity), on="barcode"
+            )
+        df["sample_qual_estimate"] = self.hyperparams.sample_qualities
+        return df
+
     def summarise_mcmc_outputs(self) -> pd.DataFrame:
         """
         Summarise MCMC outputs
@@ -335,8 +1628,162 @@ class DeletionFinder:
             short_name = mcmc.target_gene.split("-")[0]
             dt[f"{short_name}_del_posterior"] = mcmc.posterior_deleted
             dt[f"{short_name}_del_prediction"] = mcmc.posterior_deleted > 0.5
+            if isinstance(mcmc, AdaptiveDeletionMCMC):
+                dt[f"{short_name}_del_ess"] = mcmc.ess
+                dt[f"{short_name}_del_rhat"] = mcmc.rhat
         dt["sample_qual_estimate"] = self.hyperparams.sample_qualities
 
         self.df_summary = pd.DataFrame(dt)
 
-        return self.df_summary
\ No newline at end of file
+        return self.df_summary
+
+
+def run_deletion_finders(
+    finders: dict[str, DeletionFinder],
+    n_jobs: int = 1,
+    prior_del: float = 0.5,
+    seed: int | None = None,
+    batched: bool = False,
+    triage: bool = False,
+    ambiguity: float = 0.05,
+    cache: ResultCache | None = None,
+) -> dict[str, pd.DataFrame]:
+    """
+    Run every chain of every `DeletionFinder` in a workspace over one process pool
+
+    `finders` maps an experiment name to its prepared finder (hyperparameters
+    already estimated). Seeds are derived from `seed` and the experiment name, so
+    an experiment's results do not change when others are added or removed.
+    With `batched`, all chains are stacked and advanced together by
+    `BatchedDeletionMCMC` (split into one batch per process and per chain
+    length), which needs the finders to use store="summary". With `triage`,
+    every plate is first called with `DeletionFinder.fast_call_all` and only
+    plates with an ambiguous barcode are run through the MCMC. With a `cache`,
+    experiments whose inputs are unchanged since a previous run are read from it
+    and only new or changed experiments are computed; unseeded runs are never
+    cached, as they are not meant to be repeated. Returns the summarised
+    outputs keyed by experiment name
+    """
+
+    if seed is None and cache is not None:
+        print("Cache: not used because no seed was given")
+        cache = None
+
+    expt_names = list(finders)
+    summaries = {}
+    keys = {}
+    if cache is not None:
+        for expt_name, finder in finders.items():
+            keys[expt_name] = finder.cache_key(
+                prior_del, seed, expt_name, triage, ambiguity
+            )
+            cached = cache.get(keys[expt_name])
+            if cached is not None:
+                finder.df_summary = cached
+                summaries[expt_name] = cached
+        print(f"Cache: {len(summaries)} of {len(finders)} experiments already computed")
+        finders = {k: v for k, v in finders.items() if k not in summaries}
+
+    if triage:
+        for expt_name, finder in finders.items():
+            fast_df = finder.fast_call_all(prior_del, ambiguity)
+            if not fast_df.filter(like="_del_ambiguous").to_numpy().any():
+                summaries[expt_name] = fast_df
+        finders = {k: v for k, v in finders.items() if k not in summaries}
+        print(f"Triage: {len(finders)} plates need MCMC")
+
+    mcmcs = []
+    for expt_name, finder in finders.items():
+        expt_seed = np.random.SeedSequence(
+            seed, spawn_key=(zlib.crc32(expt_name.encode()),)
+        )
+        mcmcs.append(finder.create_mcmcs(prior_del, expt_seed))
+
+    results = iter(
+        run_chains([m for expt in mcmcs for m in expt], n_jobs=n_jobs, batched=batched)
+    )
+
+    for (expt_name, finder), expt in zip(finders.items(), mcmcs):
+        finder.mcmcs = [next(results) for _ in expt]
+        summaries[expt_name] = finder.summarise_mcmc_outputs()
+
+    if cache is not None:
+        for expt_name, key in keys.items():
+            if key not in cache:
+                cache.set(key, summaries[expt_name])
+
+    return {expt_name: summaries[expt_name] for expt_name in expt_names}
+
+
+# --------------------------------------------------------------------------------
+# Deletion prevalence
+#
+# --------------------------------------------------------------------------------
+DELETION_COUNT_COLUMNS = ["n_samples", "n_passed", "n_deleted"]
+
+
+def collapse_deletion_replicates(summary_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Collapse `DeletionFinder.summarise_mcmc_outputs` frames, joined to their
+    `sample_id` and `sample_type`, to one row per sample and gene. A sample is
+    called deleted if any of its replicates is
+    """
+
+    prediction_columns = sorted(c for c in summary_df.columns if c.endswith("_del_prediction"))
+    genes = [c.removesuffix("_del_prediction") for c in prediction_columns]
+    grouped = summary_df[prediction_columns].groupby(
+        [summary_df["sample_id"], summary_df["sample_type"]], observed=True
+    )
+    n_deleted, n_replicates, is_deleted = grouped.sum(), grouped.count(), grouped.max()
+
+    # Each sample's row is repeated once per gene, matching the raveled counts
+    long_df = n_deleted.index.to_frame(index=False)
+    long_df = long_df.loc[long_df.index.repeat(len(genes))].reset_index(drop=True)
+    long_df["gene"] = np.tile(genes, len(n_deleted))
+    long_df["n_deleted"] = n_deleted.to_numpy().ravel()
+    long_df["n_replicates"] = n_replicates.to_numpy().ravel()
+    long_df["is_deleted"] = is_deleted.to_numpy().ravel()
+    return long_df
+
+
+def compute_deletion_prevalence(
+    deletions_df: pd.DataFrame,
+    master_df: pd.DataFrame,
+    categories: list[str] | None = None,
+) -> dict[str, pd.DataFrame]:
+    """
+    Compute the prevalence of gene deletions overall ("All") and stratified by
+    each of `categories`, from the per-sample calls of `collapse_deletion_replicates`
+
+    Only samples in `master_df` are counted. The counts are taken once, at the
+    level of every category together, and each table is rolled up from them
+    """
+
+    categories = list(categories) if categories is not None else []
+    df = deletions_df.merge(master_df[["sample_id", *categories]], on="sample_id")
+
+    counts = pd.DataFrame({
+        "n_samples": np.ones(len(df), dtype=np.int64),
+        "n_passed": df["is_deleted"].notna().to_numpy(np.int64),
+        "n_deleted": df["is_deleted"].fillna(False).to_numpy(np.int64),
+    })
+    keys = [df[c].reset_index(drop=True) for c in ["gene", *categories]]
+    finest = counts.groupby(keys, observed=True, dropna=False).sum().reset_index()
+
+    tables = {}
+    for by in ["All", *categories]:
+        fields = [] if by == "All" else [by]
+        prev_df = (
+            finest.groupby(["gene", *fields], observed=True)[DELETION_COUNT_COLUMNS]
+            .sum()
+            .reset_index()
+        )
+
+        # Compute prevalence and its 95% confidence interval
+        prev_df["prevalence"] = 100 * prev_df["n_deleted"] / prev_df["n_passed"]
+        low, high = clopper_pearson(prev_df["n_deleted"], prev_df["n_passed"], alpha=0.05)
+        prev_df["prevalence_lowci"] = 100 * low
+        prev_df["prevalence_highci"] = 100 * high
+        tables[by] = prev_df
+
+    return tables
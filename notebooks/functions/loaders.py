@@ -0,0 +1,137 @@
+from pathlib import Path
+
+import pandas as pd
+
+# Schemas of the `nomadic summarize` outputs: the dtype to read each known
+# column with, and the columns the notebooks rely on. Columns not listed are
+# read with the usual inference
+VARIANTS_SCHEMA = {
+    "dtypes": {
+        "sample_id": "category",
+        "expt_name": "category",
+        "barcode": "category",
+        "chrom": "category",
+        "pos": "int32",
+        "ref": "category",
+        "alt": "category",
+        "gene": "category",
+        "aa_change": "category",
+        "aa_pos": "int16",
+        "mut_type": "category",
+        "mutation": "category",
+        "gt": "category",
+        "gt_int": "int8",
+        "type": "category",
+    },
+    "required": [
+        "sample_id",
+        "gene",
+        "chrom",
+        "aa_pos",
+        "aa_change",
+        "mut_type",
+        "mutation",
+        "gt_int",
+        "type",
+    ],
+}
+
+COVERAGE_SCHEMA = {
+    "dtypes": {
+        "sample_id": "category",
+        "expt_name": "category",
+        "barcode": "category",
+        "name": "category",
+        "status": "category",
+    },
+    "required": ["sample_id", "name", "status"],
+}
+
+REPLICATES_QC_SCHEMA = {
+    "dtypes": {
+        "sample_id": "category",
+        "expt_name": "category",
+        "barcode": "category",
+        # Nullable, so a sheet with missing entries still loads
+        "passing": "boolean",
+    },
+    "required": ["expt_name", "barcode", "passing"],
+}
+
+REGION_COVERAGE_SCHEMA = {
+    "dtypes": {
+        "sample_id": "category",
+        "barcode": "category",
+        "chrom": "category",
+        "start": "int32",
+        "end": "int32",
+        "name": "category",
+    },
+    "required": ["barcode", "name", "mean_cov", "n_reads"],
+}
+
+_NULLABLE_INTS = {"int8": "Int8", "int16": "Int16", "int32": "Int32", "int64": "Int64"}
+
+
+def read_summary(path: str | Path, schema: dict) -> pd.DataFrame:
+    """
+    Read a summary csv with the dtypes declared in `schema`, after checking
+    that its required columns are present
+    """
+    path = Path(path)
+    columns = pd.read_csv(path, nrows=0).columns
+    missing = [c for c in schema["required"] if c not in columns]
+    if missing:
+        raise ValueError(f"{path.name} is missing required columns: {', '.join(missing)}")
+
+    dtypes = {c: d for c, d in schema["dtypes"].items() if c in columns}
+    ints = {c: d for c, d in dtypes.items() if d in _NULLABLE_INTS}
+    df = pd.read_csv(
+        path, dtype={c: d for c, d in dtypes.items() if c not in ints}
+    )
+
+    # Integers are parsed as usual and narrowed afterwards, which is much faster
+    # than parsing straight into nullable dtypes. They only stay nullable if
+    # something is missing
+    for column, dtype in ints.items():
+        if df[column].hasnans:
+            df[column] = df[column].astype(_NULLABLE_INTS[dtype])
+        else:
+            df[column] = df[column].astype(dtype)
+
+    # Sorted categories keep groupby, pivot and sort_values in the same order
+    # as for plain strings
+    for column, dtype in dtypes.items():
+        if dtype == "category":
+            df[column] = df[column].cat.reorder_categories(
+                sorted(df[column].cat.categories)
+            )
+    return df
+
+
+def read_variants(path: str | Path) -> pd.DataFrame:
+    """
+    Read `summary.variants.analysis_set.csv` (or any variants summary)
+    """
+    return read_summary(path, VARIANTS_SCHEMA)
+
+
+def read_coverage(path: str | Path) -> pd.DataFrame:
+    """
+    Read `summary.coverage.csv`
+    """
+    return read_summary(path, COVERAGE_SCHEMA)
+
+
+def read_replicates_qc(path: str | Path) -> pd.DataFrame:
+    """
+    Read `summary.replicates_qc.csv`
+    """
+    return read_summary(path, REPLICATES_QC_SCHEMA)
+
+
+def read_region_coverage(path: str | Path) -> pd.DataFrame:
+    """
+    Read an experiment's `summary.region_coverage.csv`
+    """
+    return read_summary(path, REGION_COVERAGE_SCHEMA)
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from qc_index import QCIndex
+
+
+class MutationMatrix:
+    """
+    Sparse boolean sample x mutation matrix of the missense calls in a variants
+    table, built once so that any gene or set of genes is a column slice
+
+    Rows cover every sample in the variants table or in `ids_passed_QC` (a
+    table of the passing sample_id / gene pairs, or a `QCIndex`), and
+    columns every called mutation. Alongside the calls it keeps, for each
+    gene, the samples with any variant record and, if given, the samples that
+    passed QC, which is what the WT samples of a slice are drawn from
+    """
+
+    def __init__(
+        self,
+        variants_df: pd.DataFrame,
+        ids_passed_QC: pd.DataFrame | QCIndex | None = None,
+    ):
+        if isinstance(ids_passed_QC, QCIndex):
+            ids_passed_QC = ids_passed_QC.passed_pairs()
+        sample_ids = pd.Index(pd.unique(variants_df["sample_id"].astype(str)))
+        if ids_passed_QC is not None:
+            sample_ids = sample_ids.union(pd.Index(pd.unique(ids_passed_QC["sample_id"].astype(str))))
+        self.samples = sample_ids.sort_values()
+
+        # gt_int values: 0 = WT, 1 = het, 2 = hom mut, -1 = filtered out / no call
+        calls = variants_df[(variants_df["gt_int"] > 0) & (variants_df["mut_type"] == "missense")]
+        mutation_codes, mutations = pd.factorize(calls["mutation"].astype(str), sort=True)
+        self.mutations = pd.DataFrame(
+            {"mutation": mutations}
+        ).merge(
+            calls[["mutation", "gene", "aa_change"]].astype(str).drop_duplicates("mutation"),
+            on="mutation",
+            how="left",
+        )
+        rows = self.samples.get_indexer(calls["sample_id"].astype(str))
+        self.calls = sparse.csr_array(
+            (np.ones(len(calls), dtype=bool), (rows, mutation_codes)),
+            shape=(len(self.samples), len(mutations)),
+        )
+
+        self.gene_columns = {
+            gene: columns.to_numpy()
+            for gene, columns in self.mutations.groupby("gene").groups.items()
+        }
+        self.gene_samples = self._samples_by_gene(variants_df)
+        self.passed = None if ids_passed_QC is None else self._samples_by_gene(ids_passed_QC)
+
+    def _samples_by_gene(self, df: pd.DataFrame) -> dict[str, np.ndarray]:
+        rows = self.samples.get_indexer(df["sample_id"].astype(str))
+        genes = df["gene"].astype(str).to_numpy()
+        return {gene: np.unique(rows[genes == gene]) for gene in pd.unique(genes)}
+
+    def columns(self, genes: list[str]) -> np.ndarray:
+        """
+        Positions of the mutations of `genes`
+        """
+        columns = [self.gene_columns[g] for g in genes if g in self.gene_columns]
+        return np.unique(np.concatenate(columns)) if columns else np.zeros(0, dtype=int)
+
+    def select(self, genes: list[str]) -> tuple[sparse.csr_array, np.ndarray, np.ndarray]:
+        """
+        Calls of the samples carrying any mutation in `genes`, restricted to
+        those mutations, with the sample and mutation positions they come from
+        """
+        columns = self.columns(genes)
+        sub = self.calls[:, columns]
+        rows = np.flatnonzero(np.diff(sub.indptr))
+        return sub[rows], rows, columns
+
+    def to_frame(self, genes: list[str], wt_category_name: str = "WT") -> pd.DataFrame:
+        """
+        Dense sample x mutation table for `genes`, with mutations labelled by
+        amino acid change for a single gene or as `gene-aa_change` for several
+
+        Samples with no mutation in `genes` are added under `wt_category_name`:
+        those that passed QC for any of `genes` if QC was given, otherwise
+        those with a variant record for any of them
+        """
+        sub, rows, columns = self.select(genes)
+        labels = self.mutations["mutation" if len(genes) > 1 else "aa_change"].to_numpy()[columns]
+        order = np.argsort(labels, kind="stable")
+        mutation_matrix = pd.DataFrame(
+            sub[:, order].toarray(),
+            index=pd.Index(self.samples[rows], name="sample_id"),
+            columns=pd.Index(labels[order], name="mutation" if len(genes) > 1 else "aa_change"),
+        )
+
+        candidates = self.gene_samples if self.passed is None else self.passed
+        ref = [candidates[g] for g in genes if g in candidates]
+        ref = np.setdiff1d(np.concatenate(ref), rows) if ref else []
+        if len(ref) > 0:
+            wt_rows = pd.DataFrame(False, index=self.samples[ref], columns=mutation_matrix.columns)
+            mutation_matrix[wt_category_name] = False
+            wt_rows[wt_category_name] = True
+            mutation_matrix = pd.concat([mutation_matrix, wt_rows])
+        return mutation_matrix
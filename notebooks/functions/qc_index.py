@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+
+def _codes(index: pd.Index, values) -> np.ndarray:
+    """
+    Position of each value in `index`, or -1 if it is not there
+    """
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Look up each category once rather than every row
+        lookup = index.get_indexer(values.cat.categories.astype(str))
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, lookup[codes], -1)
+    return index.get_indexer(values.astype(str))
+
+
+class QCIndex:
+    """
+    QC status of every (sample_id, gene) pair in `summary.coverage.csv`
+
+    Samples and genes are integer coded and the pass status is held as a
+    sample x gene boolean table, so any pair is looked up by position. A gene
+    passes for a sample if any of its amplicons does. The gene of an amplicon
+    is the leading word of its name
+    """
+
+    def __init__(self, coverage_df: pd.DataFrame):
+        names = pd.Series(coverage_df["name"]).astype("category")
+        amplicon_genes = names.cat.categories.str.extract(r"(\w+)", expand=False)
+        genes = amplicon_genes.to_numpy()[names.cat.codes.to_numpy()]
+
+        self.samples = pd.Index(pd.unique(coverage_df["sample_id"].astype(str))).sort_values()
+        self.genes = pd.Index(pd.unique(amplicon_genes.dropna())).sort_values()
+
+        rows = _codes(self.samples, coverage_df["sample_id"])
+        columns = _codes(self.genes, genes)
+        tested = columns >= 0
+        passed = tested & (coverage_df["status"] == "pass").to_numpy()
+
+        self.tested = np.zeros((len(self.samples), len(self.genes)), dtype=bool)
+        self.tested[rows[tested], columns[tested]] = True
+        self.passed = np.zeros_like(self.tested)
+        self.passed[rows[passed], columns[passed]] = True
+
+    def encode(self, sample_ids, genes) -> np.ndarray:
+        """
+        Integer key of each (sample_id, gene) pair, or -1 for samples or genes
+        that are not in the index
+        """
+        rows = _codes(self.samples, sample_ids)
+        columns = _codes(self.genes, genes)
+        return np.where(
+            (rows >= 0) & (columns >= 0), rows * len(self.genes) + columns, -1
+        )
+
+    def decode(self, keys: np.ndarray) -> pd.DataFrame:
+        """
+        The (sample_id, gene) pairs of integer keys
+        """
+        rows, columns = np.divmod(np.asarray(keys), len(self.genes))
+        return pd.DataFrame(
+            {"sample_id": self.samples[rows], "gene": self.genes[columns]}
+        )
+
+    def is_passed(self, sample_ids, genes) -> np.ndarray:
+        """
+        Whether each (sample_id, gene) pair passed QC
+        """
+        keys = self.encode(sample_ids, genes)
+        passed = np.zeros(len(keys), dtype=bool)
+        passed[keys >= 0] = self.passed.ravel()[keys[keys >= 0]]
+        return passed
+
+    def passed_pairs(self, genes: list[str] | None = None) -> pd.DataFrame:
+        """
+        The (sample_id, gene) pairs that passed QC, optionally for `genes` only
+        """
+        passed = self.passed
+        if genes is not None:
+            passed = passed & self.genes.isin(list(genes))
+        return self.decode(np.flatnonzero(passed))
+
+    def reconcile(
+        self, variants_df: pd.DataFrame, genes: list[str] | None = None
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Compare the pairs that passed QC with those in a variants table,
+        optionally for `genes` only. Returns the pairs with variants that did
+        not pass QC, and the pairs that passed QC with no variants
+        """
+        pairs = variants_df[["sample_id", "gene"]]
+        if genes is not None:
+            pairs = pairs[pairs["gene"].isin(list(genes))]
+        pairs = pairs.astype(str).drop_duplicates(ignore_index=True)
+        keys = self.encode(pairs["sample_id"], pairs["gene"])
+
+        with_variants = np.zeros(self.passed.size, dtype=bool)
+        with_variants[keys[keys >= 0]] = True
+        passed = self.passed.ravel()
+        if genes is not None:
+            passed = (self.passed & self.genes.isin(list(genes))).ravel()
+
+        not_passed = pairs[~self.is_passed(pairs["sample_id"], pairs["gene"])]
+        no_variants = self.decode(np.flatnonzero(passed & ~with_variants))
+        return not_passed.reset_index(drop=True), no_variants
@@ -0,0 +1,114 @@
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from cache import hash_inputs
+
+MANIFEST_NAME = "render_manifest.json"
+
+
+@dataclass(frozen=True)
+class FigureSpec:
+    """
+    A figure to export: `builder(**kwargs)` returns a matplotlib or plotly
+    figure, which is written to `<name>.<format>`. `builder` has to be a
+    module-level function so it can be sent to worker processes
+    """
+
+    name: str
+    builder: Callable
+    kwargs: dict = field(default_factory=dict)
+    savefig_kwargs: dict = field(default_factory=dict)
+
+    def build(self):
+        return self.builder(**self.kwargs)
+
+    def key(self, save_format: str) -> str:
+        """
+        Hash of everything the exported file depends on, including the source
+        of the builder's module
+        """
+        try:
+            source = inspect.getsource(inspect.getmodule(self.builder))
+        except (OSError, TypeError):
+            source = None
+        return hash_inputs(
+            "figure-spec-v1", self.builder, source, self.kwargs, self.savefig_kwargs, save_format
+        )
+
+
+def _init_worker() -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _render(task: tuple[FigureSpec, Path]) -> Path:
+    import matplotlib.pyplot as plt
+
+    spec, path = task
+    fig = spec.build()
+    if hasattr(fig, "write_image"):
+        fig.write_image(path, **spec.savefig_kwargs)
+    else:
+        fig.savefig(path, **spec.savefig_kwargs)
+        plt.close(fig)
+    return path
+
+
+def render_figures(
+    specs: list[FigureSpec],
+    output_dir: str | Path,
+    save_format: str = "svg",
+    n_jobs: int = 1,
+    force: bool = False,
+) -> dict[str, Path]:
+    """
+    Export every figure in `specs` to `output_dir` over a pool of headless
+    (Agg) processes, returning the path of each figure by name
+
+    The input hash of each exported figure is recorded in a manifest in
+    `output_dir`, and figures whose inputs are unchanged since the last export
+    are not rendered again unless `force` is set. With `n_jobs=1` figures are
+    rendered in this process; -1 uses all cores
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+
+    paths = {}
+    keys = {}
+    tasks = []
+    for spec in specs:
+        path = output_dir / f"{spec.name}.{save_format}"
+        paths[spec.name] = path
+        keys[path.name] = spec.key(save_format)
+        if force or manifest.get(path.name) != keys[path.name] or not path.exists():
+            tasks.append((spec, path))
+    print(f"Rendering {len(tasks)} of {len(specs)} figures")
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(tasks))
+
+    if n_jobs <= 1:
+        rendered = [_render(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker) as pool:
+            rendered = list(pool.map(_render, tasks))
+
+    for path in rendered:
+        manifest[path.name] = keys[path.name]
+    # Write to a temporary file first so a crash never leaves a partial manifest
+    tmp = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(tmp, manifest_path)
+    return paths
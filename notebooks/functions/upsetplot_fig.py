@@ -4,23 +4,81 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import upsetplot as up
+from compendium import Compendium
+from mutation_matrix import MutationMatrix
+from qc_index import QCIndex
+
+
+def pack_rows(indicators: np.ndarray) -> np.ndarray:
+    """
+    Encode each row of a boolean matrix as a bitmask, packed into bytes
+    """
+    return np.packbits(np.asarray(indicators, dtype=bool), axis=1)
+
+
+def count_signatures(indicators: np.ndarray) -> np.ndarray:
+    """
+    For each row of a boolean matrix, the number of rows with the same pattern
+    """
+    packed = pack_rows(indicators)
+    if packed.size == 0:
+        # No rows, or no columns so that every row has the same (empty) pattern
+        return np.full(len(packed), len(packed))
+    # View each packed row as a single opaque value so np.unique compares rows
+    signatures = np.ascontiguousarray(packed).view(
+        np.dtype((np.void, packed.shape[1]))
+    ).ravel()
+    _, inverse, counts = np.unique(signatures, return_inverse=True, return_counts=True)
+    return counts[inverse.ravel()]
+
+
+def match_combinations(mutation_matrix: pd.DataFrame, combinations) -> pd.DataFrame:
+    """
+    Keep only the largest combination of mutations carried by each sample (the
+    first one listed when several are equally large); samples carrying no
+    complete combination are left with no mutations
+
+    Samples and combinations are encoded as bitmasks over the matrix columns,
+    so a sample carries a combination when `sample & combo == combo`
+    """
+    columns = mutation_matrix.columns
+    combo_sets = [set(c) for c in combinations]
+    matched = np.zeros(mutation_matrix.shape, dtype=bool)
+    if not combo_sets:
+        return pd.DataFrame(matched, index=mutation_matrix.index, columns=columns)
+
+    combo_indicators = np.array([columns.isin(list(c)) for c in combo_sets], dtype=bool)
+    combo_indicators = combo_indicators.reshape(len(combo_sets), len(columns))
+    sizes = combo_indicators.sum(axis=1)
+    # A combination with a mutation that is not a column can never be carried
+    complete = sizes == np.array([len(c) for c in combo_sets])
+
+    sample_masks = pack_rows(mutation_matrix.to_numpy())[:, None, :]
+    combo_masks = pack_rows(combo_indicators)[None, :, :]
+    carried = ((sample_masks & combo_masks) == combo_masks).all(axis=2) & complete
+
+    # argmax returns the first of the largest carried combinations
+    best = np.where(carried, sizes, -1).argmax(axis=1)
+    has_combo = carried.any(axis=1)
+    matched[has_combo] = combo_indicators[best[has_combo]]
+    return pd.DataFrame(matched, index=mutation_matrix.index, columns=columns)
 
 
 def upsetplot_fig(
-    variants_df: pd.DataFrame,
+    variants_df: pd.DataFrame | MutationMatrix,
     genes: str | list[str],
-    muts_dict: dict,
-    ids_passed_QC: pd.DataFrame | None = None,
+    muts_dict: dict | Compendium,
+    ids_passed_QC: pd.DataFrame | QCIndex | None = None,
     min_prevalence: float | None = None,
     combinations_only: bool = False,
 ) -> plt.Figure:
     """
     Generate an upset plot in a matplot figure based on the provided DataFrame and values column.
     Args:
-        variants_df (pd.DataFrame): DataFrame containing all variant calls
+        variants_df (pd.DataFrame | MutationMatrix): DataFrame containing all variant calls, or the matrix built from them
         genes (str | list(str)): Name of the gene(s) to generate the plot for
-        muts_dict (dict): Dictionary of mutations and combinations
-        ids_passed_QC (pd.DataFrame): All samples (gene / amplicon level) that have passed QC
+        muts_dict (dict | Compendium): Dictionary of mutations and combinations, or the compiled compendium
+        ids_passed_QC (pd.DataFrame | QCIndex): All samples (gene / amplicon level) that have passed QC, or the QC index. Only used with a DataFrame of variant calls
         min_prevalence (float): Minimum prevalence threshold under which mutations will be collapsed into a single category.
         combinations_only (bool): Removes all data except for samples carrying a combination of defined mutations.
     Returns:
@@ -30,19 +88,6 @@ def upsetplot_fig(
     assert not (min_prevalence is not None and combinations_only), \
         "Specify either min_prevalence or combinations_only, not both."
 
-    def filter_row(row):
-        """
-        Identifes the largest combination of mutations that match a sample
-        """
-        mutated = set(row.index[row])
-        matched = [combo for combo in combo_sets if combo.issubset(mutated)]
-
-        if not matched:
-            return pd.Series(False, index=row.index)
-        
-        best_combo = max(matched, key=len)
-        return pd.Series(row.index.isin(best_combo), index=row.index)
-    
     if isinstance(genes, str):
         genes = [genes]
 
@@ -52,74 +97,27 @@ def upsetplot_fig(
         ############################
         # Extract mutation metadata
         ############################
-        candidate = []
-        validated = []
-        combinations = {}
-        for gene in genes:
-            target = muts_dict.get(gene, {})
-            prefix = f"{gene}-" if len(genes)>1 else ""
-            candidate += [f"{prefix}{c}" for c in target.get("candidate", [])]
-            validated += [f"{prefix}{v}" for v in target.get("validated", [])]
-            combos = target.get("combinations", {})
-            for key, value in combos.items():
-                mutations = [f"{prefix}{a}" for a in value]
-                combinations[key] = mutations
-                
-        ############################
-        # Add in multigene combinations
-        ############################
-        if len(genes) > 1:
-            multitarget = muts_dict.get("multigene", {})
-            for gene_grp, values in multitarget.items():
-                gs = gene_grp.split("-")
-                if set(gs).issubset(genes):
-                    combinations = combinations | values
-                
-        ############################
-        # Filter variants
-        ############################
-        variants_df = variants_df[variants_df["gene"].isin(genes)]
-        all_ids = set(variants_df["sample_id"])
-        # gt_int values: 0 = WT, 1 = het, 2 = hom mut, -1 = filtered out / no call
-        variants_df = variants_df[variants_df["gt_int"] > 0]
-        variants_df = variants_df[variants_df["mut_type"] == "missense"]
-        
+        if not isinstance(muts_dict, Compendium):
+            muts_dict = Compendium(muts_dict)
+        compendium = muts_dict.view(genes)
+        candidate = compendium.candidate
+        validated = compendium.validated
+        combinations = compendium.combinations
+
         ############################
         # Build mutation matrix
         ############################
-        mutation_matrix = pd.crosstab(
-            variants_df["sample_id"],
-            variants_df["mutation" if len(genes)>1 else "aa_change"],
-        )
-        mutation_matrix = mutation_matrix.astype(bool)
-        
-        ############################
-        # Add WT samples
-        ############################
-        ids_nonref = set(variants_df["sample_id"])
-
-        if ids_passed_QC is not None:
-            ids_ref = set(
-                ids_passed_QC.query("gene in @genes and sample_id not in @ids_nonref")[
-                    "sample_id"
-                ]
-            )
+        if isinstance(variants_df, MutationMatrix):
+            assert ids_passed_QC is None, \
+                "ids_passed_QC is taken from the MutationMatrix, do not pass it separately."
+            calls = variants_df
         else:
-            ids_ref = all_ids - ids_nonref
+            calls = MutationMatrix(variants_df[variants_df["gene"].isin(genes)], ids_passed_QC)
 
+        # Samples without any of the mutations are added as WT
         wt_category_name = "WT"
+        mutation_matrix = calls.to_frame(genes, wt_category_name)
 
-        if len(ids_ref) > 0:
-            new_rows_df = pd.DataFrame(
-                False,
-                index=list(ids_ref),
-                columns=mutation_matrix.columns,
-            )
-
-            mutation_matrix[wt_category_name] = False
-            new_rows_df[wt_category_name] = True
-            mutation_matrix = pd.concat([mutation_matrix, new_rows_df])
-        
         ############################
         # Handle empty/single-category
         ############################
@@ -147,11 +145,10 @@ def upsetplot_fig(
             ax.axis("off")
 
         if combinations_only:
-            unique_combo_muts = {mut for combo in combinations.values() for mut in combo}
+            unique_combo_muts = compendium.combination_mutations
             drop_noncombo_cols = [f for f in mutation_matrix.columns if f not in unique_combo_muts ]
             mutation_matrix.drop(columns=drop_noncombo_cols, inplace=True)
-            combo_sets = [set(c) for c in combinations.values()]
-            mutation_matrix = mutation_matrix.apply(filter_row, axis=1)
+            mutation_matrix = match_combinations(mutation_matrix, combinations.values())
 
         elif min_prevalence is not None:
             test_columns = ["_sub-threshold"]
@@ -168,20 +165,10 @@ def upsetplot_fig(
             # Identify min_count that relates to min_prevalence threhold
             min_count = round(len(mutation_matrix) * (min_prevalence / 100), 0)
 
-            # Collapse matrix into a single column of tuples representing the mutation pattern for each sample
-            mut_signatures = mutation_matrix.apply(
-                lambda row: tuple(row),
-                axis=1,
-            )
-
-            # Count each mutation combination
-            mut_signature_counts = mut_signatures.value_counts()
-            # Identify those below threshold and add to matrix
-            subthresh_signatures = set(
-                mut_signature_counts[mut_signature_counts < min_count].index
-            )
-            mutation_matrix["_sub-threshold"] = mut_signatures.apply(
-                lambda x: x in subthresh_signatures
+            # Count the samples sharing each sample's mutation pattern and flag
+            # those below threshold
+            mutation_matrix["_sub-threshold"] = (
+                count_signatures(mutation_matrix.to_numpy()) < min_count
             )
 
             # Keep entries that are above the threshold and don't have validated markers
@@ -310,28 +297,25 @@ def upsetplot_fig(
         intersections_names = list(up_obj.intersections.index.names)
 
         legend_names = []
-        combo_keys = list(combinations.keys())
+        combo_keys = {name: i for i, name in enumerate(combinations)}
 
         # Loop through each intersection (column) first
         for col_idx, subset in enumerate(intersections_idx):
             muts_present = [name for name, present in zip(intersections_names, subset) if present]
 
             # Find every combo fully contained in this intersection
-            matching_combos = [
-                (combo_name, members)
-                for combo_name, members in combinations.items()
-                if all(x in muts_present for x in members)
-            ]
+            matching_combos = compendium.carried_combinations(muts_present)
 
             if not matching_combos:
                 continue
 
             # Keep only the most specific (largest) matching combo for this column
-            combo_name, members = max(matching_combos, key=lambda item: len(item[1]))
-            colour_idx = combo_keys.index(combo_name)
+            combo_name = max(matching_combos, key=lambda name: len(combinations[name]))
+            combo_mask = compendium.combination_masks[combo_name]
+            colour_idx = combo_keys[combo_name]
 
             for row_idx, mut in enumerate(intersections_names):
-                if mut in members:
+                if compendium.mask([mut]) & combo_mask:
                     if combo_name in legend_names:
                         ax.scatter(col_idx, row_idx, color=colours[colour_idx], s=80, zorder=20)
                     else:
@@ -1,7 +1,18 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
 from pathlib import Path
+from types import CodeType
+from typing import Callable
 
+import numpy as np
+import pandas as pd
 import yaml
 
+from loaders import read_coverage, read_region_coverage, read_replicates_qc, read_variants
+
 class Workspace:   
     def __init__(self, config_file: str = "../config.yaml"):
         self.config_path = Path(config_file).expanduser().resolve()
@@ -13,6 +24,11 @@ class Workspace:
         self.summaries_path = self.path / "summaries" / self.name
         self.metadata_path = self.path / "metadata"
         self.master_csv_path = self.metadata_path / f"{self.name}.csv"
+        # Local copies of the tables read from the (often network synced)
+        # workspace folder, see `load_table`
+        cache_dir = self.config_dict.get("cache_dir", Path.cwd() / "cache")
+        self.cache_path = Path(cache_dir).expanduser().resolve() / "tables" / self.name
+        self._tables: dict[tuple[Path, str], tuple[list[int], pd.DataFrame]] = {}
         print(f"Workspace loaded: {self.name} from {self.path}")
 
     def extract_config_values(self, config_path: Path) -> dict:
@@ -40,3 +56,165 @@ class Workspace:
         if not ws_path.exists():
             raise FileNotFoundError(f"Workspace path {ws_path} does not exist")
         return ws_path
+
+    def load_table(self, source: Path, reader: Callable[[Path], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Read `source` with `reader`, keeping the table in memory and a local copy
+        in `cache_path` (Parquet, or pickle for tables Parquet cannot hold). Both
+        are only used while the modification time and size of `source` are
+        unchanged, and so is the loaded code of `reader` (e.g. the schemas in
+        `loaders.py`). Returns a copy, so callers are free to modify it
+        """
+        stat = source.stat()
+        reader_name = f"{reader.__module__}.{reader.__qualname__}"
+        signature = [stat.st_mtime_ns, stat.st_size, _code_hash(reader)]
+        memo = self._tables.get((source, reader_name))
+        if memo is not None and memo[0] == signature:
+            return memo[1].copy()
+
+        key = hashlib.sha256(f"{source}:{reader_name}".encode()).hexdigest()[:16]
+        # No dots in the name, so suffixes can be swapped with `with_suffix`
+        stem = self.cache_path / f"{source.stem.replace('.', '_')}-{key}"
+        df = None
+        try:
+            meta = json.loads(stem.with_suffix(".json").read_text())
+            if meta["signature"] == signature:
+                df = _read_local(stem.with_suffix(meta["format"]))
+        except (FileNotFoundError, KeyError, ValueError):
+            pass
+
+        if df is None:
+            df = reader(source)
+            self.cache_path.mkdir(parents=True, exist_ok=True)
+            fmt = _write_local(df, stem)
+            meta = {"source": str(source), "signature": signature, "format": fmt}
+            _replace_file(stem.with_suffix(".json"), json.dumps(meta).encode())
+
+        self._tables[(source, reader_name)] = (signature, df)
+        return df.copy()
+
+    @property
+    def master(self) -> pd.DataFrame:
+        """
+        Master metadata of the workspace samples
+        """
+        return self.load_table(self.master_csv_path, pd.read_csv)
+
+    @property
+    def variants(self) -> pd.DataFrame:
+        """
+        Variant calls filtered for false positives etc (`summary.variants.analysis_set.csv`)
+        """
+        return self.load_table(self.summaries_path / "summary.variants.analysis_set.csv", read_variants)
+
+    @property
+    def coverage(self) -> pd.DataFrame:
+        """
+        Per sample amplicon coverage and QC status (`summary.coverage.csv`)
+        """
+        return self.load_table(self.summaries_path / "summary.coverage.csv", read_coverage)
+
+    @property
+    def replicates_qc(self) -> pd.DataFrame:
+        """
+        QC status of every replicate (`summary.replicates_qc.csv`)
+        """
+        return self.load_table(self.summaries_path / "summary.replicates_qc.csv", read_replicates_qc)
+
+    def region_coverage(self, expt_name: str) -> pd.DataFrame:
+        """
+        Region coverage of a single experiment in `results`
+        """
+        return self.load_table(
+            self.results_path / expt_name / "summary.region_coverage.csv", read_region_coverage
+        )
+
+
+def _code_hash(func: Callable) -> str:
+    """
+    Hash of the code `func` is running, including the functions and plain
+    values (e.g. schema dicts) of its own module that it refers to. Taken from
+    the loaded objects rather than the file, so it follows what the kernel runs
+    """
+    h = hashlib.sha256()
+    seen = set()
+    funcs = [inspect.unwrap(func)]
+    while funcs:
+        f = funcs.pop()
+        if id(f) in seen or not hasattr(f, "__code__"):
+            continue
+        seen.add(id(f))
+        h.update(_stable_repr((f.__defaults__, f.__kwdefaults__)).encode())
+        for code in _walk_code(f.__code__):
+            h.update(code.co_code)
+            consts = [c for c in code.co_consts if not isinstance(c, CodeType)]
+            h.update(_stable_repr(consts).encode())
+            for name in code.co_names:
+                value = f.__globals__.get(name)
+                if inspect.isfunction(value) and value.__module__ == func.__module__:
+                    funcs.append(value)
+                elif isinstance(value, (dict, list, tuple, set, frozenset, str, int, float)):
+                    h.update(_stable_repr((name, value)).encode())
+    return h.hexdigest()
+
+
+def _walk_code(code: CodeType):
+    # Comprehensions and nested functions are code objects of their own
+    yield code
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            yield from _walk_code(const)
+
+
+def _stable_repr(value) -> str:
+    # Sets are ordered by string hashes, which change between sessions
+    if isinstance(value, (set, frozenset)):
+        return "{" + ", ".join(sorted(map(_stable_repr, value))) + "}"
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{_stable_repr(k)}: {_stable_repr(v)}" for k, v in value.items()) + "}"
+    if isinstance(value, (list, tuple)):
+        return "(" + ", ".join(map(_stable_repr, value)) + ")"
+    if value is None or isinstance(value, (str, bytes, int, float)):
+        return repr(value)
+    # Other reprs may hold memory addresses
+    return type(value).__qualname__
+
+
+def _replace_file(path: Path, data: bytes) -> None:
+    # Write to a temporary file first so a crash never leaves a partial file
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _write_local(df: pd.DataFrame, stem: Path) -> str:
+    """
+    Write a local copy of `df` next to `stem`, returning the suffix used
+    """
+    try:
+        path = stem.with_suffix(".parquet")
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        df.to_parquet(tmp)
+        os.replace(tmp, path)
+        return ".parquet"
+    except (ImportError, ValueError, TypeError, NotImplementedError):
+        tmp.unlink(missing_ok=True)
+    _replace_file(stem.with_suffix(".pkl"), pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+    return ".pkl"
+
+
+def _read_local(path: Path) -> pd.DataFrame | None:
+    """
+    Read a local copy written by `_write_local`, or None if it is unreadable
+    """
+    try:
+        if path.suffix == ".parquet":
+            df = pd.read_parquet(path)
+            # Parquet gives missing strings back as None, `read_csv` as NaN
+            strings = df.select_dtypes("object").columns
+            df[strings] = df[strings].where(df[strings].notna(), np.nan)
+            return df
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, ImportError, ValueError, EOFError, pickle.UnpicklingError):
+        return None